@@ -1,9 +1,23 @@
 #!/usr/bin/python
 import numpy as np
+import logging
 
 
 from scipy.integrate import solve_ivp
 
+
+def _notify_solutions():
+    """Log a notice that the instructor solutions are in use, once per process"""
+    # The logger is shared by every solution file, and so the notice is only emitted
+    # once, even when several files are loaded
+    logger = logging.getLogger("cphy.solutions")
+    if not getattr(logger, "notified", False):
+        logger.warning(
+            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions"
+        )
+        logger.notified = True
+
+
 class AllenCahn:
     """
     An implementation of the Allen-Cahn equation in two dimensions, using the method
@@ -26,10 +40,7 @@ class AllenCahn:
         self.dy = Ly / ny
         self.d = d
         self.kappa = kappa
-        print(
-            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions", 
-            flush=True
-        )
+        _notify_solutions()
        
     def _laplace(self, grid):
         """
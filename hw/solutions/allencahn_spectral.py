@@ -1,7 +1,21 @@
 #!/usr/bin/python
 import numpy as np
+import logging
 from scipy.integrate import solve_ivp
 
+
+def _notify_solutions():
+    """Log a notice that the instructor solutions are in use, once per process"""
+    # The logger is shared by every solution file, and so the notice is only emitted
+    # once, even when several files are loaded
+    logger = logging.getLogger("cphy.solutions")
+    if not getattr(logger, "notified", False):
+        logger.warning(
+            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions"
+        )
+        logger.notified = True
+
+
 class AllenCahn:
     """
     Simulate the two-dimensional Allen-Cahn model using spectral methods
@@ -20,10 +34,7 @@ class AllenCahn:
         kxx, kyy = np.meshgrid(kx, ky)
         ksq = kxx**2 + kyy**2
         self.ksq = ksq.flatten()
-        print(
-            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions", 
-            flush=True
-        )
+        _notify_solutions()
 
         
     def _reaction(self, y):
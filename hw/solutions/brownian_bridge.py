@@ -1,5 +1,31 @@
 #!/usr/bin/python
 import numpy as np
+import logging
+
+
+def _notify_solutions():
+    """Log a notice that the instructor solutions are in use, once per process"""
+    # The logger is shared by every solution file, and so the notice is only emitted
+    # once, even when several files are loaded
+    logger = logging.getLogger("cphy.solutions")
+    if not getattr(logger, "notified", False):
+        logger.warning(
+            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions"
+        )
+        logger.notified = True
+
+
+def _get_rng(random_state):
+    """
+    Return the random number generator used by a simulation. A Generator is used as-is,
+    an integer seeds the global random state, and None uses the global random state
+    without resetting it.
+    """
+    if isinstance(random_state, np.random.Generator):
+        return random_state
+    if random_state is not None:
+        np.random.seed(random_state)
+    return np.random
 
 
 class BridgeBaseClass:
@@ -11,16 +37,18 @@ class BridgeBaseClass:
         T (float): The total time of the simulation.
         a (float): The starting value of the process.
         b (float): The ending value of the process.
+        random_state (int | np.random.Generator): The random seed. A Generator is used 
+            directly, without touching the global random state. The default value of 
+            None uses the global random state without resetting it.
     """
 
-    def __init__(self, T=1.0, a=0.0, b=0.0):
+    def __init__(self, T=1.0, a=0.0, b=0.0, random_state=None):
         self.T = T
         self.a = a
         self.b = b
-        print(
-            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions", 
-            flush=True
-        )
+        self.random_state = random_state
+        self.rng = _get_rng(random_state)
+        _notify_solutions()
 
     def simulate(self, n_steps):
         """Implement the simulation method. Override this method in subclasses."""
@@ -49,7 +77,7 @@ class BrownianBridgeRejection(BridgeBaseClass):
             np.ndarray: A 1D array of shape (n_steps) containing the simulated 
                 Brownian bridge.
         """
-        steps = np.random.normal(size=(self.n_rejections, n_steps))
+        steps = self.rng.normal(size=(self.n_rejections, n_steps))
         walks = np.cumsum(steps, axis=1) # cumulative sum into walks[:, 1:]
         closest_return = np.argmin(np.abs(walks[:, -1] - self.b), axis=0)
         return walks[closest_return]
@@ -64,7 +92,7 @@ class BrownianBridgeTransform(BridgeBaseClass):
 
     def simulate(self, n_steps):
         """Simulate a Brownian bridge using a transformation of standard Brownian motion."""
-        steps = np.random.normal(size=(n_steps))
+        steps = self.rng.normal(size=(n_steps))
         walk = np.cumsum(steps)
         walk = np.concatenate([[0], walk])
         t = np.linspace(0, self.T, n_steps + 1)
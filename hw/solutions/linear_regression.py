@@ -1,8 +1,21 @@
 #!/usr/bin/python
 import numpy as np
+import logging
 import warnings
 
 
+def _notify_solutions():
+    """Log a notice that the instructor solutions are in use, once per process"""
+    # The logger is shared by every solution file, and so the notice is only emitted
+    # once, even when several files are loaded
+    logger = logging.getLogger("cphy.solutions")
+    if not getattr(logger, "notified", False):
+        logger.warning(
+            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions"
+        )
+        logger.notified = True
+
+
 class BaseRegressor:
     """
     A base class for regression models.
@@ -47,10 +60,7 @@ class LinearRegressor(BaseRegressor):
         self.method = method
         self.regularization = regularization
         self.regstrength = regstrength
-        print(
-            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions", 
-            flush=True
-        )
+        _notify_solutions()
 
     # functions that begin with underscores are private, by convention.
     # Technically we could access them from outside the class, but we should
@@ -1,10 +1,24 @@
 #!/usr/bin/python
 import numpy as np
+import logging
 
 
 
 from sklearn.base import BaseEstimator, TransformerMixin
 
+
+def _notify_solutions():
+    """Log a notice that the instructor solutions are in use, once per process"""
+    # The logger is shared by every solution file, and so the notice is only emitted
+    # once, even when several files are loaded
+    logger = logging.getLogger("cphy.solutions")
+    if not getattr(logger, "notified", False):
+        logger.warning(
+            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions"
+        )
+        logger.notified = True
+
+
 # We are going to use class inheritance to define our object. The two base classes from
 # scikit-learn represent placeholder objects for working with datasets. They include 
 # many generic methods, like fetching parameters, getting the data shape, etc.
@@ -18,13 +32,10 @@ class PrincipalComponents(BaseEstimator, TransformerMixin):
 
     def __init__(self, random_state=None):
         self.random_state = random_state
-        np.random.seed(self.random_state)
+        # PCA is deterministic, and so the global random state is left untouched
         self.components_ = None
         self.singular_values_ = None
-        print(
-            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions", 
-            flush=True
-        )
+        _notify_solutions()
 
     def fit(self, X):
         """
@@ -1,5 +1,121 @@
 #!/usr/bin/python
 import numpy as np
+import logging
+import json
+from scipy.stats import binom, norm
+
+
+def _notify_solutions():
+    """Log a notice that the instructor solutions are in use, once per process"""
+    # The logger is shared by every solution file, and so the notice is only emitted
+    # once, even when several files are loaded
+    logger = logging.getLogger("cphy.solutions")
+    if not getattr(logger, "notified", False):
+        logger.warning(
+            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions"
+        )
+        logger.notified = True
+
+
+def _get_rng(random_state):
+    """
+    Return the random number generator used by a simulation. A Generator is used as-is,
+    an integer seeds the global random state, and None uses the global random state
+    without resetting it.
+    """
+    if isinstance(random_state, np.random.Generator):
+        return random_state
+    if random_state is not None:
+        np.random.seed(random_state)
+    return np.random
+
+
+def _get_rng_state(rng):
+    """
+    Return the state of a random number generator as a JSON string, which can be stored
+    in an npz file without pickling. The global random state is used for numpy.random.
+    """
+    if isinstance(rng, np.random.Generator):
+        state = rng.bit_generator.state
+    else:
+        state = np.random.get_state(legacy=False)
+    return json.dumps(state, default=lambda x: x.tolist())
+
+
+def _set_rng_state(rng, state):
+    """Restore the state of a random number generator saved by _get_rng_state"""
+    state = json.loads(str(state))
+    if "key" in state["state"]:
+        # The Mersenne Twister key is stored as a list
+        state["state"]["key"] = np.array(state["state"]["key"], dtype=np.uint32)
+    if isinstance(rng, np.random.Generator):
+        rng.bit_generator.state = state
+    else:
+        np.random.set_state(state)
+
+
+def _union_find_roots(n_nodes, a, b, roots=None):
+    """
+    Label the connected components of a graph with n_nodes nodes and edges (a[k], b[k]),
+    using a union-find forest that is updated for all edges at once.
+
+    Every round finds the roots of both endpoints of each remaining edge, and hooks the
+    larger root onto the smaller one, until both endpoints of every edge share a root.
+    Because each root only ever points to a smaller label, the forest stays acyclic.
+    Edges inside a single cluster are dropped after each round. While many edges 
+    remain, the paths of every node are compressed by pointer jumping, which halves 
+    the depth of the forest at each step. Once only a few edges remain, it is cheaper 
+    to follow the parent pointers of their endpoints alone, compressing just those 
+    paths.
+
+    Args:
+        n_nodes (int): The number of nodes in the graph
+        a (np.ndarray): The first endpoint of each edge
+        b (np.ndarray): The second endpoint of each edge
+        roots (np.ndarray): An existing forest to add the edges to, such as the output
+            of a previous call. If None, every node starts in its own cluster.
+
+    Returns:
+        roots (np.ndarray): The root label of every node. Two nodes are in the same
+            cluster if and only if they have the same root
+    """
+    dtype = np.int32 if n_nodes < np.iinfo(np.int32).max else np.int64
+    if roots is None:
+        roots = np.arange(n_nodes, dtype=dtype)
+    a, b = np.asarray(a, dtype=dtype), np.asarray(b, dtype=dtype)
+    while len(a) > 0:
+        if len(a) > n_nodes // 32:
+            roots = _compress(roots)
+            ra, rb = roots[a], roots[b]
+        else:
+            ra, rb = _find_roots(roots, a), _find_roots(roots, b)
+            roots[a], roots[b] = ra, rb
+        # Edges within a single cluster will never need to be visited again
+        unmerged = ra != rb
+        a, b, ra, rb = a[unmerged], b[unmerged], ra[unmerged], rb[unmerged]
+        roots[np.maximum(ra, rb)] = np.minimum(ra, rb)
+    return _compress(roots)
+
+
+def _compress(roots):
+    """Point every node directly at its root, by repeated pointer jumping"""
+    while True:
+        grandparents = roots[roots]
+        if np.array_equal(grandparents, roots):
+            return roots
+        roots = grandparents
+
+
+def _find_roots(roots, nodes):
+    """Follow the parent pointers in roots from each node until reaching a root"""
+    nodes = roots[nodes]
+    while True:
+        parents = roots[nodes]
+        unfinished = parents != nodes
+        if not np.any(unfinished):
+            return nodes
+        nodes[unfinished] = parents[unfinished]
+
 
 class PercolationSimulation:
     """
@@ -28,42 +144,173 @@ class PercolationSimulation:
         grid (np.array): the original lattice of blocked (0) and open (1) sites
         grid_filled (np.array): the lattice after water has been poured in
         n (int): number of rows and columns in the lattice
+        shape (tuple): the number of sites along each axis of the lattice. The lattice
+            can be a d-dimensional hypercubic lattice of any aspect ratio, in which case
+            water is poured in along the first axis.
+        boundary (tuple): the boundary condition along each axis. "open" sites have no
+            neighbors beyond the edge of the lattice, "periodic" sites wrap around to
+            the opposite edge, and "occupied" sites have a layer of open sites beyond
+            the edge, which connects every open site on that face of the lattice. The
+            first axis cannot be periodic, since water would then wrap directly from 
+            the top of the lattice to the bottom.
         p (float): probability of a site being blocked in the randomly-sampled lattice
             random_state (int): random seed for the random number generator
-        random_state (int): random seed for numpy's random number generator. Used to 
-            ensure reproducibility across random simulations. The default value of None
-            will use the current state of the random number generator without resetting
-            it.
+        model (str): the kind of disorder in a random lattice. "site" blocks each 
+            site with probability p, while "bond" leaves every site open, and instead
+            blocks each bond between neighboring sites with probability p.
+        bonds (tuple): for bond percolation, a boolean array for each axis, with the 
+            same shape as the lattice, which marks whether the bond from each site to 
+            its next neighbor along that axis is open. Along a periodic axis, the bond
+            from the last site wraps around to the first site. None for site 
+            percolation.
+        correlation_length (float): if not None, a random site lattice is sampled with
+            correlated disorder, by thresholding Gaussian noise that is smoothed over
+            this many sites
+        method (str): the flood fill used by percolate. "recursive" floods the grid
+            from every open site in the top row, while "union_find" labels every 
+            cluster of open sites at once, and so does not hit the recursion limit on 
+            large lattices. Only "union_find" supports lattices that are not square, 
+            that do not have open boundaries, or that have random bonds.
+        cluster_statistics (bool): whether percolate also measures every cluster of 
+            open sites. This requires the "union_find" method, which labels every 
+            cluster while it fills the lattice. The results are stored in the 
+            attributes below.
+        cluster_labels (np.ndarray): the cluster index of each site, or -1 for blocked
+            sites
+        cluster_sizes (np.ndarray): the number of sites in each cluster
+        cluster_size_distribution (np.ndarray): the number of clusters of each size, 
+            where entry s is the number of clusters with s sites
+        cluster_radii (np.ndarray): the radius of gyration of each cluster
+        cluster_bounding_boxes (np.ndarray): the first and last index of each cluster
+            along each axis, as an array of shape (n_clusters, 2 * d). In 2D, the 
+            columns are the first row, first column, last row and last column. Clusters
+            that wrap around a periodic boundary are measured without unwrapping.
+        spanning_cluster (int): the index of the largest cluster that touches both the
+            top and bottom rows, or -1 if no cluster spans the lattice
+        spanning_cluster_size (int): the number of sites in the spanning cluster
+        spanning_radius_of_gyration (float): the radius of gyration of the spanning 
+            cluster, or nan if no cluster spans the lattice
+        random_state (int | np.random.Generator): random seed for numpy's random number 
+            generator. Used to ensure reproducibility across random simulations. The 
+            default value of None will use the current state of the random number 
+            generator without resetting it. If a Generator is passed, it is used for all 
+            random draws instead of the global random state.
     """
 
-    def __init__(self, n=100, p=0.5, grid=None, random_state=None):
+    # Map from the method keyword to the name of the flood fill. Subclasses can extend
+    # this dictionary to register additional engines.
+    _flow_methods = {
+        "recursive": "_flow",
+        "union_find": "_flow_union_find"
+    }
+
+    def __init__(
+        self, 
+        n=100, 
+        p=0.5, 
+        grid=None, 
+        random_state=None, 
+        method="recursive", 
+        cluster_statistics=False,
+        shape=None,
+        boundary="open",
+        model="site",
+        bonds=None,
+        correlation_length=None
+    ):
         """
         Initialize a PercolationSimulation object.
 
         Args:
             n (int): number of rows and columns in the lattice
             p (float): probability of a site being blocked in the randomly-sampled lattice
-            random_state (int): random seed for numpy's random number generator. Used to
-                ensure reproducibility across random simulations. The default value of None
-                will use the current state of the random number generator without resetting
-                it.
+            random_state (int | np.random.Generator): random seed for numpy's random 
+                number generator. Used to ensure reproducibility across random 
+                simulations. The default value of None will use the current state of the 
+                random number generator without resetting it. A Generator is used 
+                directly, without touching the global random state.
+            method (str): the flood fill used by percolate, "recursive" or "union_find"
+            cluster_statistics (bool): whether percolate also measures every cluster of
+                open sites, which requires the "union_find" method
+            shape (tuple): the number of sites along each axis of a random lattice. If
+                None, the lattice is n x n.
+            boundary (str | tuple): the boundary condition along every axis, or a tuple
+                with one boundary condition per axis. Either "open", "periodic" or 
+                "occupied". The first axis, along which water is poured, cannot be 
+                periodic.
+            model (str): the kind of disorder in a random lattice, "site" or "bond"
+            bonds (tuple): a boolean array for each axis, marking whether the bond from
+                each site to its next neighbor along that axis is open. If provided, 
+                the lattice uses bond percolation, and every site is open unless a grid
+                is also provided.
+            correlation_length (float): if not None, the random site lattice is sampled 
+                by thresholding Gaussian noise that is smoothed over this many sites
         """
 
         self.random_state = random_state # the random seed
+        if method not in self._flow_methods:
+            raise ValueError(
+                f"Unknown method {method}, expected one of {list(self._flow_methods)}"
+            )
+        self.method = method
+        self._flow_engine = getattr(self, self._flow_methods[method])
+        if cluster_statistics and method != "union_find":
+            raise ValueError("Cluster statistics require the union_find method")
+        self.cluster_statistics = cluster_statistics
+        if model not in ("site", "bond"):
+            raise ValueError(f"Unknown model {model}, expected 'site' or 'bond'")
+        self.model = model
+        self.correlation_length = correlation_length
+        self.bonds = None
 
         # Initialize a random grid if one is not provided. Otherwise, use the provided
         # grid.
+        if bonds is not None:
+            self.model = "bond"
+            self.bonds = tuple(np.asarray(mask, dtype=bool) for mask in bonds)
+            if grid is None:
+                grid = np.ones(self.bonds[0].shape, dtype=int)
+                self.p = 1 - np.mean(self.bonds)
+            assert len(self.bonds) == grid.ndim, "A bond mask is required for every axis"
+            for mask in self.bonds:
+                assert mask.shape == grid.shape, "Bond masks must match the lattice shape"
         if grid is None:
-            self.n = n
+            self.shape = (n, n) if shape is None else tuple(shape)
+            self.n = self.shape[0]
             self.p = p
-            self.grid = np.zeros((n, n))
+            self.grid = np.zeros(self.shape)
             self._initialize_grid()
         else:
             assert len(np.unique(np.ravel(grid))) <= 2, "Grid must only contain 0s and 1s"
             self.grid = grid.astype(int)
             # override numbers if grid is provided
+            self.shape = grid.shape
             self.n = grid.shape[0]
-            self.p = 1 - np.mean(grid)
+            if bonds is None:
+                self.p = 1 - np.mean(grid)
+
+        if isinstance(boundary, str):
+            boundary = (boundary,) * len(self.shape)
+        if len(boundary) != len(self.shape):
+            raise ValueError("A boundary condition is required for every axis")
+        for condition in boundary:
+            if condition not in ("open", "periodic", "occupied"):
+                raise ValueError(f"Unknown boundary condition {condition}")
+        if boundary[0] == "periodic":
+            raise ValueError(
+                "The first axis is the percolation direction, and cannot be periodic. "
+                "Pass a tuple such as ('open', 'periodic') instead."
+            )
+        self.boundary = tuple(boundary)
+        is_square = len(self.shape) == 2 and self.shape[0] == self.shape[1]
+        is_simple = is_square and set(self.boundary) == {"open"} and self.bonds is None
+        if method != "union_find" and not is_simple:
+            raise ValueError(
+                "Only the union_find method supports non-square lattices, boundaries "
+                "and bonds"
+            )
+        # The offset between the flat indices of neighboring sites along each axis
+        self._strides = np.cumprod((self.shape[1:] + (1,))[::-1])[::-1]
 
         # The filled grid used in the percolation calculation. Initialize to the original
         # grid. We technically don't need to copy the original grid if we want to save
@@ -71,10 +318,7 @@ class PercolationSimulation:
         # from self.grid.
         self.grid_filled = np.copy(self.grid)
 
-        print(
-            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions", 
-            flush=True
-        )
+        _notify_solutions()
 
     def _initialize_grid(self):
         """
@@ -100,9 +344,34 @@ class PercolationSimulation:
         # Hint: my solution is 3 lines of code in numpy
 
         ###############################################################################
-        np.random.seed(self.random_state)
-        self.grid = np.random.choice([1, 0], size=(self.n, self.n), p=[1 - self.p, self.p])
+        self.rng = _get_rng(self.random_state)
+        if self.model == "bond":
+            self.grid = np.ones(self.shape, dtype=int)
+            self.bonds = tuple(self.rng.random(self.shape) >= self.p for _ in self.shape)
+        elif self.correlation_length is not None:
+            self.grid = self._correlated_grid()
+        else:
+            self.grid = self.rng.choice([1, 0], size=self.shape, p=[1 - self.p, self.p])
         self.grid_filled = np.copy(self.grid)
+
+    def _correlated_grid(self):
+        """
+        Sample a lattice with correlated disorder. White noise is smoothed with a
+        Gaussian filter in Fourier space, and normalized to unit variance. Sites are 
+        blocked where the smoothed noise falls below the quantile p of a standard 
+        normal distribution, and so each site is still blocked with probability p.
+        """
+        noise = self.rng.standard_normal(self.shape)
+        wavenumbers = np.meshgrid(
+            *[2 * np.pi * np.fft.fftfreq(length) for length in self.shape], 
+            indexing="ij"
+        )
+        k_sq = sum(k ** 2 for k in wavenumbers)
+        kernel = np.exp(-0.5 * k_sq * self.correlation_length ** 2)
+        # Normalize the filter so that the smoothed noise has unit variance
+        kernel /= np.sqrt(np.mean(kernel ** 2))
+        smoothed = np.real(np.fft.ifftn(np.fft.fftn(noise) * kernel))
+        return (smoothed >= norm.ppf(self.p)).astype(int)
         
 
     def _flow_recursive(self, i, j):
@@ -163,6 +432,118 @@ class PercolationSimulation:
             self._flow_recursive(0, i)
 
 
+    ## UNION-FIND
+    def _flow_union_find(self):
+        """
+        Run a percolation simulation by labelling the clusters of open sites with a
+        union-find forest, instead of flooding the grid site by site.
+
+        A virtual top node is joined to every open site in the top row, and every open
+        site in the same cluster as the virtual top node is filled. The lattice 
+        percolates if the virtual top node shares a root with an open site in the 
+        bottom row. A second virtual node joined to the bottom row would answer this
+        with a single comparison, but it would also wrongly fill every cluster that
+        touches the bottom row of a percolating lattice, and so the bottom row is
+        checked directly instead.
+
+        The virtual top node is only joined after the clusters of open sites have been
+        labelled, so that the clusters can be measured before the top node merges the
+        clusters that touch the top row.
+
+        The lattice can have any number of dimensions. Neighbors are found by adding
+        the flat-index stride of each axis to the flat index of each site, and so the 
+        same code handles every dimension and boundary condition.
+        """
+        n_sites = self.grid.size
+        top = n_sites
+        is_open = self.grid.astype(bool).ravel()
+        sites = np.flatnonzero(is_open)
+
+        # Bonds between adjacent open sites along each axis. Lattices with occupied 
+        # boundaries get a virtual node beyond each face, placed after the top node
+        a, b = [], []
+        for axis, (length, stride) in enumerate(zip(self.shape, self._strides)):
+            coordinate = sites // stride % length
+            inside = coordinate < length - 1
+            neighbors = sites + stride
+            if self.boundary[axis] == "periodic":
+                neighbors[~inside] -= length * stride
+                inside = np.ones_like(inside)
+            inside[inside] = is_open[neighbors[inside]]
+            if self.bonds is not None:
+                inside &= self.bonds[axis].ravel()[sites]
+            a.append(sites[inside])
+            b.append(neighbors[inside])
+            if self.boundary[axis] == "occupied":
+                for side, face in enumerate((0, length - 1)):
+                    on_face = sites[coordinate == face]
+                    a.append(on_face)
+                    b.append(np.full(len(on_face), top + 1 + 2 * axis + side))
+        n_nodes = n_sites + 1 + 2 * len(self.shape)
+        roots = _union_find_roots(n_nodes, np.concatenate(a), np.concatenate(b))
+        if self.cluster_statistics:
+            self._measure_clusters(
+                roots[:n_sites].reshape(self.shape), is_open.reshape(self.shape)
+            )
+
+        first_layer = sites[sites // self._strides[0] == 0]
+        last_layer = sites[sites // self._strides[0] == self.shape[0] - 1]
+        roots = _union_find_roots(
+            n_nodes, first_layer, np.full(len(first_layer), top), roots=roots
+        )
+
+        self.percolates = np.any(roots[last_layer] == roots[top])
+        wet = is_open & (roots[:n_sites] == roots[top])
+        self.grid_filled[wet.reshape(self.shape)] = 2
+
+    def _measure_clusters(self, roots, is_open):
+        """
+        Measure the size, radius of gyration and bounding box of every cluster of open
+        sites, and find the spanning cluster. Writes to the cluster attributes.
+
+        Args:
+            roots (np.ndarray): the union-find root of every site in the lattice
+            is_open (np.ndarray): a boolean array marking the open sites
+        """
+        coordinates = np.nonzero(is_open)
+        # Relabel the roots as consecutive cluster indices
+        _, labels = np.unique(roots[coordinates], return_inverse=True)
+        labels = labels.ravel()
+        self.cluster_labels = np.full(self.grid.shape, -1, dtype=labels.dtype)
+        self.cluster_labels[coordinates] = labels
+
+        sizes = np.bincount(labels)
+        self.cluster_sizes = sizes
+        self.cluster_size_distribution = np.bincount(sizes)
+
+        # Radius of gyration from the first and second moments of the site positions
+        mean_sq = sum(np.bincount(labels, x.astype(float) ** 2) for x in coordinates)
+        sq_mean = sum((np.bincount(labels, x) / sizes) ** 2 for x in coordinates)
+        self.cluster_radii = np.sqrt(np.maximum(mean_sq / sizes - sq_mean, 0))
+
+        # Sort the sites by cluster, so that each cluster is a contiguous block
+        order = np.argsort(labels, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        n_axes = len(coordinates)
+        self.cluster_bounding_boxes = np.zeros((len(sizes), 2 * n_axes), dtype=int)
+        if len(sizes) > 0:
+            self.cluster_bounding_boxes = np.stack(
+                [np.minimum.reduceat(x[order], starts) for x in coordinates]
+                + [np.maximum.reduceat(x[order], starts) for x in coordinates], 
+                axis=1
+            )
+
+        spanning = np.intersect1d(self.cluster_labels[0], self.cluster_labels[-1])
+        spanning = spanning[spanning >= 0]
+        if len(spanning) > 0:
+            self.spanning_cluster = spanning[np.argmax(sizes[spanning])]
+            self.spanning_cluster_size = sizes[self.spanning_cluster]
+            self.spanning_radius_of_gyration = self.cluster_radii[self.spanning_cluster]
+        else:
+            self.spanning_cluster = -1
+            self.spanning_cluster_size = 0
+            self.spanning_radius_of_gyration = np.nan
+
     def _poll_neighbors(self, i, j):
         """
         Check whether there is a filled site adjacent to a site at coordinates i, j in 
@@ -202,10 +583,433 @@ class PercolationSimulation:
         #     self._flow2(0, i)
 
         # Run the flow algorithm and report the results
-        self._flow()
+        self._flow_engine()
         
         # return True if any site is full
         return np.any(self.grid_filled[-1] == 2) 
 
+    def save_checkpoint(self, path):
+        """
+        Save the lattice, the filled lattice and the state of the random number 
+        generator to a compressed .npz file, so that a sequence of random lattices can
+        be resumed exactly with load_checkpoint.
+
+        Args:
+            path (str): The checkpoint file. numpy adds the .npz extension if missing.
+        """
+        # The random draws use the Generator if one was passed, and otherwise the
+        # global random state, as in _get_rng
+        state = {
+            "grid": self.grid,
+            "grid_filled": self.grid_filled,
+            "p": self.p,
+            "rng_state": _get_rng_state(self.random_state)
+        }
+        if self.bonds is not None:
+            state["bonds"] = np.stack(self.bonds)
+        np.savez_compressed(path, **state)
+
+    def load_checkpoint(self, path):
+        """
+        Restore the lattice, the filled lattice and the state of the random number 
+        generator from a file written by save_checkpoint. The simulation must have the
+        same lattice shape and percolation model as the simulation that was saved.
+
+        Args:
+            path (str): The checkpoint file.
+
+        Returns:
+            self (PercolationSimulation): The restored simulation
+        """
+        with np.load(path) as checkpoint:
+            if checkpoint["grid"].shape != self.shape:
+                raise ValueError("The checkpoint has a different lattice shape")
+            if ("bonds" in checkpoint) != (self.bonds is not None):
+                raise ValueError("The checkpoint has a different percolation model")
+            self.grid = checkpoint["grid"].copy()
+            self.grid_filled = checkpoint["grid_filled"].copy()
+            self.p = float(checkpoint["p"])
+            if self.bonds is not None:
+                self.bonds = tuple(checkpoint["bonds"])
+            _set_rng_state(self.random_state, checkpoint["rng_state"])
+        return self
+
+
+class PackedPercolationSimulation(PercolationSimulation):
+    """
+    A percolation simulation that stores the lattice as packed bits, rather than as
+    integer arrays. The open sites and the filled sites are each stored with one bit 
+    per site, in rows of bytes packed by np.packbits, and so a lattice takes 2 bits 
+    per site instead of the 16 bytes used by PercolationSimulation. Water spreads 
+    along each row with bitwise operations on whole rows at once.
+
+    The grid and grid_filled attributes are unpacked on demand, and so they should 
+    only be accessed for small lattices.
+
+    Attributes:
+        open_bits (np.ndarray): the packed open (1) and blocked (0) sites, with shape
+            (n, ceil(n / 8)) and little-endian bit order within each byte
+        wet_bits (np.ndarray): the packed filled (1) and dry (0) sites, with the same
+            shape and layout as open_bits
+        n (int): number of rows and columns in the lattice
+        p (float): probability of a site being blocked in the randomly-sampled lattice
+        random_state (int | np.random.Generator): random seed for numpy's random number 
+            generator
+
+    The lattice is always a square 2D site lattice with open boundaries, and so the 
+    shape, boundary, model and method attributes of PercolationSimulation are fixed.
+    """
 
+    # The packed lattice has a single flood fill, which works on whole rows of bits
+    _flow_methods = {"packed": "_flow"}
 
+    def __init__(self, n=100, p=0.5, grid=None, random_state=None):
+        self.random_state = random_state
+        self.method = "packed"
+        self._flow_engine = getattr(self, self._flow_methods[self.method])
+        self.cluster_statistics = False
+        self.model = "site"
+        self.correlation_length = None
+        self.bonds = None
+        if grid is None:
+            self.n = n
+            self.p = p
+            self._initialize_grid()
+        else:
+            assert len(np.unique(np.ravel(grid))) <= 2, "Grid must only contain 0s and 1s"
+            self.n = grid.shape[0]
+            self.p = 1 - np.mean(grid)
+            self.open_bits = np.packbits(
+                np.asarray(grid, dtype=bool), axis=1, bitorder="little"
+            )
+        self.wet_bits = np.zeros_like(self.open_bits)
+        self.shape = (self.n, self.n)
+        self.boundary = ("open", "open")
+        self._strides = np.array([self.n, 1])
+        _notify_solutions()
+
+    @property
+    def grid(self):
+        return np.unpackbits(
+            self.open_bits, axis=1, count=self.n, bitorder="little"
+        ).astype(int)
+
+    @property
+    def grid_filled(self):
+        wet = np.unpackbits(self.wet_bits, axis=1, count=self.n, bitorder="little")
+        return self.grid + wet
+
+    def _initialize_grid(self):
+        """
+        Sample a random lattice by thresholding uniform random numbers. The lattice is 
+        sampled and packed in blocks of rows, so that the full unpacked lattice never 
+        needs to be stored.
+        """
+        self.rng = _get_rng(self.random_state)
+        self.open_bits = np.empty((self.n, (self.n + 7) // 8), dtype=np.uint8)
+        block = max(1, 2**22 // self.n)
+        for start in range(0, self.n, block):
+            draws = self.rng.random((min(block, self.n - start), self.n))
+            self.open_bits[start:start + block] = np.packbits(
+                draws >= self.p, axis=1, bitorder="little"
+            )
+
+    def _row(self, bits, i):
+        """Read row i of a packed lattice as an integer, with bit j set for site j"""
+        return int.from_bytes(bits[i].tobytes(), "little")
+
+    def _flow(self):
+        """
+        Run a percolation simulation on the packed lattice. Each row is handled as a 
+        single integer, so that water spreads along a whole row with a few bitwise 
+        operations. The rows are swept alternately downwards and upwards, filling each
+        row from the filled sites above and below it, until a full sweep leaves every
+        row unchanged.
+        """
+        n_rows = self.n
+        wet = [0] * n_rows
+        wet[0] = self._row(self.open_bits, 0)
+        downwards = True
+        changed = True
+        while changed:
+            changed = False
+            rows = range(1, n_rows) if downwards else range(n_rows - 2, -1, -1)
+            for i in rows:
+                sources = wet[i]
+                if i > 0:
+                    sources |= wet[i - 1]
+                if i < n_rows - 1:
+                    sources |= wet[i + 1]
+                if sources == wet[i]:
+                    continue
+                is_open = self._row(self.open_bits, i)
+                filled = _fill_row_bits(sources & is_open, is_open)
+                if filled != wet[i]:
+                    wet[i] = filled
+                    changed = True
+            downwards = not downwards
+
+        n_bytes = self.wet_bits.shape[1]
+        for i in range(n_rows):
+            self.wet_bits[i] = np.frombuffer(
+                wet[i].to_bytes(n_bytes, "little"), dtype=np.uint8
+            )
+
+    def percolate(self):
+        """
+        Initialize a random lattice and then run a percolation simulation. Report results
+        """
+        self._flow()
+        return bool(np.any(self.wet_bits[-1]))
+
+    def save_checkpoint(self, path):
+        """
+        Save the packed lattice, the packed filled sites and the state of the random 
+        number generator to a compressed .npz file.
+
+        Args:
+            path (str): The checkpoint file. numpy adds the .npz extension if missing.
+        """
+        np.savez_compressed(
+            path, 
+            open_bits=self.open_bits, 
+            wet_bits=self.wet_bits, 
+            p=self.p, 
+            rng_state=_get_rng_state(self.random_state)
+        )
+
+    def load_checkpoint(self, path):
+        """
+        Restore the packed lattice, the packed filled sites and the state of the random
+        number generator from a file written by save_checkpoint.
+
+        Args:
+            path (str): The checkpoint file.
+
+        Returns:
+            self (PackedPercolationSimulation): The restored simulation
+        """
+        with np.load(path) as checkpoint:
+            if checkpoint["open_bits"].shape != self.open_bits.shape:
+                raise ValueError("The checkpoint has a different lattice size")
+            self.open_bits = checkpoint["open_bits"].copy()
+            self.wet_bits = checkpoint["wet_bits"].copy()
+            self.p = float(checkpoint["p"])
+            _set_rng_state(self.random_state, checkpoint["rng_state"])
+        return self
+
+
+def _fill_row_bits(seeds, is_open):
+    """
+    Spread the seeds along the runs of set bits in is_open, in both directions. This 
+    is an occluded fill, which doubles the distance covered at each step, and so a row 
+    of n sites is filled in log2(n) steps.
+
+    Args:
+        seeds (int): the bits of the sites that are already filled, a subset of is_open
+        is_open (int): the bits of the open sites
+
+    Returns:
+        filled (int): the bits of every open site in the same run as a seed
+    """
+    up, down = seeds, seeds
+    open_up, open_down = is_open, is_open
+    shift = 1
+    while (open_up | open_down) and (shift < is_open.bit_length()):
+        up |= open_up & (up << shift)
+        open_up &= open_up << shift
+        down |= open_down & (down >> shift)
+        open_down &= open_down >> shift
+        shift *= 2
+    return up | down
+
+
+
+
+
+def newman_ziff_sweep(n=100, n_samples=1, random_state=None):
+    """
+    Estimate percolation observables at every occupation number of an n x n lattice,
+    using the Newman-Ziff algorithm. Rather than sampling a new lattice for every 
+    value of p, open sites are added one at a time in a random order, and the clusters
+    are updated incrementally with a weighted union-find forest. A single pass over
+    the lattice therefore measures every occupation number at once.
+
+    As in PercolationSimulation, a lattice percolates if a cluster of open sites 
+    connects the top and bottom rows. Use binomial_average to convert the results into
+    curves over the probability p of a site being blocked.
+
+    Args:
+        n (int): number of rows and columns in the lattice
+        n_samples (int): number of independent orderings to average over
+        random_state (int | np.random.Generator): random seed for the random number
+            generator. The default value of None will use the current state of the
+            random number generator without resetting it.
+
+    Returns:
+        results (dict): Arrays of length n * n + 1, where entry m is the average over
+            samples with m open sites of
+            "spanning": whether the lattice percolates
+            "largest_cluster": the fraction of all sites in the largest cluster
+            "mean_cluster_size": the mean size of the cluster containing a random open 
+                site, excluding spanning clusters
+    """
+    rng = _get_rng(random_state)
+    n_sites = n * n
+    index = np.arange(n_sites).reshape(n, n)
+
+    # The von Neumann neighborhood of each site, with -1 marking sites out of bounds
+    neighbors = np.full((n, n, 4), -1)
+    neighbors[1:, :, 0], neighbors[:-1, :, 1] = index[:-1], index[1:]
+    neighbors[:, 1:, 2], neighbors[:, :-1, 3] = index[:, :-1], index[:, 1:]
+    neighbors = neighbors.reshape(n_sites, 4).tolist()
+
+    # Bit flags marking the sites in the top (1) and bottom (2) rows
+    edges = np.zeros((n, n), dtype=int)
+    edges[0] |= 1
+    edges[-1] |= 2
+    edges = edges.ravel().tolist()
+
+    results = {
+        "spanning": np.zeros(n_sites + 1),
+        "largest_cluster": np.zeros(n_sites + 1),
+        "mean_cluster_size": np.zeros(n_sites + 1)
+    }
+    for _ in range(n_samples):
+        spanning, largest, mean_size = _newman_ziff_pass(
+            rng.permutation(n_sites).tolist(), neighbors, edges
+        )
+        results["spanning"] += spanning
+        results["largest_cluster"] += largest
+        results["mean_cluster_size"] += mean_size
+    for key in results:
+        results[key] /= n_samples
+    return results
+
+
+def _newman_ziff_pass(order, neighbors, edges):
+    """
+    Add the sites of a lattice one at a time in the given order, and record the 
+    observables after each addition. Each cluster is stored as a tree of sites, and
+    its root holds the size of the cluster and the bit flags of the rows it touches.
+    """
+    n_sites = len(order)
+    parent = [-1] * n_sites # -1 marks a blocked site
+    size = [0] * n_sites
+    touches = [0] * n_sites
+
+    spanning = np.zeros(n_sites + 1)
+    largest = np.zeros(n_sites + 1)
+    mean_size = np.zeros(n_sites + 1)
+    spans = False
+    max_size = 0
+    # Running sums of s and s^2 over the clusters that do not span the lattice
+    sum_s, sum_s2 = 0, 0
+
+    def find(site):
+        # Path halving: point every other site on the path at its grandparent
+        while parent[site] != site:
+            parent[site] = parent[parent[site]]
+            site = parent[site]
+        return site
+
+    for m, site in enumerate(order, start=1):
+        parent[site] = site
+        size[site] = 1
+        touches[site] = edges[site]
+        root = site
+        if touches[site] != 3:
+            sum_s, sum_s2 = sum_s + 1, sum_s2 + 1
+
+        for neighbor in neighbors[site]:
+            if neighbor < 0 or parent[neighbor] < 0:
+                continue
+            other = find(neighbor)
+            if other == root:
+                continue
+            # Union by size: attach the smaller tree below the root of the larger one
+            if size[root] < size[other]:
+                root, other = other, root
+            for r in (root, other):
+                if touches[r] != 3:
+                    sum_s, sum_s2 = sum_s - size[r], sum_s2 - size[r] ** 2
+            parent[other] = root
+            size[root] += size[other]
+            touches[root] |= touches[other]
+            if touches[root] != 3:
+                sum_s, sum_s2 = sum_s + size[root], sum_s2 + size[root] ** 2
+
+        spans = spans or touches[root] == 3
+        max_size = max(max_size, size[root])
+        spanning[m] = spans
+        largest[m] = max_size / n_sites
+        mean_size[m] = sum_s2 / sum_s if sum_s > 0 else 0.0
+
+    return spanning, largest, mean_size
+
+
+def binomial_average(values, p):
+    """
+    Convert an observable measured at every occupation number into its average over
+    random lattices in which each site is blocked with probability p. Lattices with m
+    open sites out of N occur with binomial probability, and so the average is the 
+    convolution of the observable with the binomial distribution.
+
+    Args:
+        values (np.ndarray): the observable at each occupation number m = 0, ..., N, 
+            such as one of the arrays returned by newman_ziff_sweep
+        p (float | np.ndarray): probability of a site being blocked
+
+    Returns:
+        averages (np.ndarray): the average of the observable at each value of p
+    """
+    values = np.asarray(values, dtype=float)
+    n_sites = len(values) - 1
+    occupation = np.arange(n_sites + 1)
+    p = np.atleast_1d(p)
+    averages = np.array([
+        np.dot(binom.pmf(occupation, n_sites, 1 - pval), values) for pval in p
+    ])
+    return averages
+
+
+def percolate_batch(grids):
+    """
+    Run a percolation simulation on a stack of lattices at once. Instead of flooding
+    each lattice site by site, water spreads through every lattice in the stack with
+    whole-array shifts of the filled sites, masked by the open sites, until no 
+    lattice changes. Lattices stop being updated as soon as they stop changing.
+
+    Args:
+        grids (np.ndarray): a stack of lattices of shape (B, n_rows, n_cols), with
+            blocked (0) and open (1) sites
+
+    Returns:
+        percolates (np.ndarray): a boolean array of length B, which is True for each
+            lattice that percolates
+        grids_filled (np.ndarray): the stack of lattices after water has been poured 
+            in, with filled sites marked by 2
+    """
+    grids = np.asarray(grids)
+    assert grids.ndim == 3, "grids must have shape (B, n_rows, n_cols)"
+    is_open = grids.astype(bool)
+    wet = np.zeros_like(is_open)
+    wet[:, 0] = is_open[:, 0]
+
+    active = np.arange(len(grids))
+    while len(active) > 0:
+        current, mask = wet[active], is_open[active]
+        grown = current.copy()
+        grown[:, 1:] |= current[:, :-1]
+        grown[:, :-1] |= current[:, 1:]
+        grown[:, :, 1:] |= current[:, :, :-1]
+        grown[:, :, :-1] |= current[:, :, 1:]
+        grown &= mask
+        changed = np.any(grown != current, axis=(1, 2))
+        wet[active] = grown
+        active = active[changed]
+
+    grids_filled = grids.astype(int)
+    grids_filled[wet] = 2
+    percolates = np.any(wet[:, -1], axis=1)
+    return percolates, grids_filled
@@ -1,6 +1,20 @@
 #!/usr/bin/python
 import numpy as np
 
+
+def _get_rng(random_state):
+    """
+    Return the random number generator used by a simulation. A Generator is used as-is,
+    an integer seeds the global random state, and None uses the global random state
+    without resetting it.
+    """
+    if isinstance(random_state, np.random.Generator):
+        return random_state
+    if random_state is not None:
+        np.random.seed(random_state)
+    return np.random
+
+
 class PercolationSimulation:
     """
     A simulation of a 2D directed percolation problem. Given a 2D lattice, blocked sites
@@ -30,10 +44,11 @@ class PercolationSimulation:
         n (int): number of rows and columns in the lattice
         p (float): probability of a site being blocked in the randomly-sampled lattice
             random_state (int): random seed for the random number generator
-        random_state (int): random seed for numpy's random number generator. Used to 
-            ensure reproducibility across random simulations. The default value of None
-            will use the current state of the random number generator without resetting
-            it.
+        random_state (int | np.random.Generator): random seed for numpy's random number
+            generator. Used to ensure reproducibility across random simulations. The 
+            default value of None will use the current state of the random number 
+            generator without resetting it. If a Generator is passed, it is used for all
+            random draws instead of the global random state.
     """
 
     def __init__(self, n=100, p=0.5, grid=None, random_state=None):
@@ -43,10 +58,11 @@ class PercolationSimulation:
         Args:
             n (int): number of rows and columns in the lattice
             p (float): probability of a site being blocked in the randomly-sampled lattice
-            random_state (int): random seed for numpy's random number generator. Used to
-                ensure reproducibility across random simulations. The default value of None
-                will use the current state of the random number generator without resetting
-                it.
+            random_state (int | np.random.Generator): random seed for numpy's random 
+                number generator. Used to ensure reproducibility across random 
+                simulations. The default value of None will use the current state of the 
+                random number generator without resetting it. A Generator is used 
+                directly, without touching the global random state.
         """
 
         self.random_state = random_state # the random seed
@@ -95,8 +111,8 @@ class PercolationSimulation:
         # Hint: my solution is 3 lines of code in numpy
 
         ###############################################################################
-        np.random.seed(self.random_state)
-        self.grid = np.random.choice([1, 0], size=(self.n, self.n), p=[1 - self.p, self.p])
+        self.rng = _get_rng(self.random_state)
+        self.grid = self.rng.choice([1, 0], size=(self.n, self.n), p=[1 - self.p, self.p])
         self.grid_filled = np.copy(self.grid)
         
     def _poll_neighbors(self, i, j):
@@ -121,14 +137,47 @@ class PercolationSimulation:
 
         return any([top, left, right, bottom])
 
+    def _fill_row(self, i, sources):
+        """
+        Fill every contiguous run of open sites in row i that contains a source site.
+        Water spreads freely along a run of open sites, and so a whole run is filled
+        as soon as any one of its sites is reachable.
+
+        Args:
+            i (int): the index of the row
+            sources (np.ndarray): a boolean array marking the sites in row i that are
+                reachable from a filled site
+
+        Returns:
+            filled (bool): whether any site in row i is filled
+        """
+        is_open = self.grid[i] == 1
+        # The run-length boundaries of the open sites, where +1 marks the start of a run
+        boundaries = np.diff(np.concatenate(([0], is_open.astype(np.int8), [0])))
+        is_start = boundaries[:-1] == 1
+        if not np.any(is_start):
+            return False
+        # Label each site by its run, and check whether each run contains a source
+        runs = np.cumsum(is_start) - 1
+        wet_runs = np.logical_or.reduceat(sources & is_open, np.flatnonzero(is_start))
+        wet = is_open & wet_runs[runs]
+        self.grid_filled[i, wet] = 2
+        return np.any(wet)
+
     ## NON-RECURSIVE
-    def _flow(self):
+    def _flow(self, backward=True):
         """
         Run a directed percolation simulation without recursion
 
         This method writes to the grid and grid_filled attributes, but it does not
         return anything. In other languages like Java or C, this method would return
         void
+
+        Args:
+            backward (bool): whether to do a backwards pass over the grid after the 
+                forward pass. The forward pass alone determines whether the lattice
+                percolates, but the backward pass is needed to fill every accessible
+                site in grid_filled.
         """
 
         ####### YOUR CODE HERE  ####### 
@@ -145,43 +194,36 @@ class PercolationSimulation:
         # Fill first row
         self.grid_filled[0, self.grid[0] == 1] = 2
 
-        # Iterate over remaining rows
+        # Iterate over remaining rows. Rather than polling the neighbors of each site,
+        # we fill every run of open sites that lies below a filled site
         for i in range(1, self.n):
-
-            # We do two passes over the row: forwards and backwards. Why do we need the 
-            # second pass? Think about pathological site configurations that we might
-            # miss in the first pass alone
-            for j in np.hstack([np.arange(self.n), np.arange(self.n)[::-1]]):
-                if self.grid[i, j] == 1:
-                    if self._poll_neighbors(i, j):
-                        self.grid_filled[i, j] = 2
-            
             # Check to see if any sites in the current row are filled, and end the 
             # simulation early if none. This isn't necessary, but saves runtime
             # although the difference is a prefactor not a factor of N
-            if np.all(self.grid_filled[i] != 2):
+            if not self._fill_row(i, self.grid_filled[i - 1] == 2):
                 break
 
         # Do a backwards pass over the grid to fill in any remaining sites. This step is
         # not necessary to determine whether the lattice percolates, but it is necessary
         # to make sure that our fill function finds all of the accessible sites
-
-        for i in range(2, self.n):
-            for j in np.hstack([np.arange(self.n), np.arange(self.n)[::-1]]):
-                if self.grid[self.n - i, j] == 1:
-                    if self._poll_neighbors(self.n - i, j):
-                        self.grid_filled[self.n - i, j] = 2
-
-
-
-
-
-
-
-
-    def percolate(self):
+        if not backward:
+            return None
+        for i in range(self.n - 2, 0, -1):
+            sources = (
+                (self.grid_filled[i] == 2) 
+                | (self.grid_filled[i - 1] == 2) 
+                | (self.grid_filled[i + 1] == 2)
+            )
+            self._fill_row(i, sources)
+
+    def percolate(self, backward=True):
         """
         Initialize a random lattice and then run a percolation simulation. Report results
+
+        Args:
+            backward (bool): whether to fill every accessible site in grid_filled. 
+                Callers that only need to know whether the lattice percolates can skip 
+                the backwards pass over the grid.
         """
         ###############################################################################
 
@@ -195,7 +237,7 @@ class PercolationSimulation:
         #     self._flow2(0, i)
 
         # Run the flow algorithm and report the results
-        self._flow()
+        self._flow(backward=backward)
         
         # return True if any site is full
         return np.any(self.grid_filled[-1] == 2) 
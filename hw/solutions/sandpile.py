@@ -1,9 +1,320 @@
 #!/usr/bin/python
 import numpy as np
+import logging
+import json
+import pickle
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _notify_solutions():
+    """Log a notice that the instructor solutions are in use, once per process"""
+    # The logger is shared by every solution file, and so the notice is only emitted
+    # once, even when several files are loaded
+    logger = logging.getLogger("cphy.solutions")
+    if not getattr(logger, "notified", False):
+        logger.warning(
+            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions"
+        )
+        logger.notified = True
+
+
+def _get_rng(random_state):
+    """
+    Return the random number generator used by a simulation. A Generator is used as-is,
+    an integer seeds the global random state, and None uses the global random state
+    without resetting it.
+    """
+    if isinstance(random_state, np.random.Generator):
+        return random_state
+    if random_state is not None:
+        np.random.seed(random_state)
+    return np.random
+
+
+def _get_rng_state(rng):
+    """
+    Return the state of a random number generator as a JSON string, which can be stored
+    in an npz file without pickling. The global random state is used for numpy.random.
+    """
+    if isinstance(rng, np.random.Generator):
+        state = rng.bit_generator.state
+    else:
+        state = np.random.get_state(legacy=False)
+    return json.dumps(state, default=lambda x: x.tolist())
+
+
+def _set_rng_state(rng, state):
+    """Restore the state of a random number generator saved by _get_rng_state"""
+    state = json.loads(str(state))
+    if "key" in state["state"]:
+        # The Mersenne Twister key is stored as a list
+        state["state"]["key"] = np.array(state["state"]["key"], dtype=np.uint32)
+    if isinstance(rng, np.random.Generator):
+        rng.bit_generator.state = state
+    else:
+        np.random.set_state(state)
 
 
 # DFS: O(N_v + N_E)
 
+class SandpileHistory:
+    """
+    A compact store for a sequence of sandpile snapshots. Storing a full copy of the
+    grid at every step uses 8 n^2 bytes per grain, even though an avalanche usually 
+    changes only a few sites. Instead, every keyframe_interval snapshots we store the
+    full grid as a uint8 keyframe, and in between we only store the flat indices and 
+    new values of the sites that changed since the previous snapshot. Snapshot t is 
+    reconstructed by replaying the deltas since the most recent keyframe.
+
+    The store behaves like a read-only list: it supports len(), random access with
+    history[t], and lazy iteration, which is useful for animations.
+
+    Parameters:
+        keyframe_interval (int): The number of snapshots between two keyframes. Larger
+            values use less memory, but make random access slower.
+        path (str): If None, the snapshots are kept in memory. Otherwise, they are
+            written to files with this prefix and read back through memory maps, so 
+            that long runs do not hold the history in RAM.
+        append (bool): If True, the files at path are opened for appending rather than
+            overwritten, so that a run resumed with AbelianSandpile.load_checkpoint can
+            continue the history that was stored before the checkpoint.
+
+    Attributes:
+        shape (tuple): The shape of the stored grids
+    """
+
+    def __init__(self, keyframe_interval=100, path=None, append=False):
+        self.keyframe_interval = keyframe_interval
+        self.path = path
+        self.shape = None
+        self._last = None # the most recent snapshot, used to compute the next delta
+
+        # The deltas of snapshot t are the entries offsets[t]:offsets[t + 1] of the 
+        # indices and values streams. Keyframes have empty deltas.
+        self._offsets = array("q", [0])
+        self._dtypes = {"keyframes": np.uint8, "indices": np.int32, "values": np.uint8}
+        if path is None:
+            self._streams = {name: bytearray() for name in self._dtypes}
+        else:
+            mode = "ab" if append else "wb"
+            self._streams = {name: open(f"{path}.{name}", mode) for name in self._dtypes}
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def _write(self, name, values):
+        """Append an array to one of the streams"""
+        data = np.ascontiguousarray(values, dtype=self._dtypes[name]).tobytes()
+        if self.path is None:
+            self._streams[name].extend(data)
+        else:
+            self._streams[name].write(data)
+
+    def _read(self, name, start, count):
+        """Read count entries of one of the streams, starting at entry start"""
+        dtype = np.dtype(self._dtypes[name])
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        if self.path is None:
+            # We copy the values, so that no view prevents the buffer from growing
+            return np.frombuffer(
+                self._streams[name], dtype=dtype, count=count, offset=start * dtype.itemsize
+            ).copy()
+        self._streams[name].flush()
+        return np.memmap(
+            f"{self.path}.{name}", dtype=dtype, mode="r", 
+            offset=start * dtype.itemsize, shape=(count,)
+        )
+
+    def append(self, grid):
+        """
+        Add a snapshot to the history. Heights must fit in a uint8, which is always the
+        case for a stable sandpile.
+
+        Args:
+            grid (np.ndarray): The grid to store
+        """
+        grid = np.asarray(grid)
+        if self.shape is None:
+            self.shape = grid.shape
+        grid = grid.astype(np.uint8).reshape(-1)
+        if len(self) % self.keyframe_interval == 0:
+            self._write("keyframes", grid)
+            n_changed = 0
+        else:
+            changed = np.flatnonzero(grid != self._last)
+            self._write("indices", changed)
+            self._write("values", grid[changed])
+            n_changed = len(changed)
+        self._offsets.append(self._offsets[-1] + n_changed)
+        self._last = grid
+
+    def __getitem__(self, t):
+        """Reconstruct snapshot t"""
+        if t < 0:
+            t += len(self)
+        if not 0 <= t < len(self):
+            raise IndexError("History index out of range")
+        if t == len(self) - 1:
+            return self._last.reshape(self.shape).copy()
+
+        # Start from the most recent keyframe, and then replay the deltas in order
+        size = self._last.size
+        k = t // self.keyframe_interval
+        frame = self._read("keyframes", k * size, size).copy()
+        first = k * self.keyframe_interval
+        start, stop = self._offsets[first + 1], self._offsets[t + 1]
+        indices = self._read("indices", start, stop - start)
+        values = self._read("values", start, stop - start)
+        for s in range(first + 1, t + 1):
+            lo, hi = self._offsets[s] - start, self._offsets[s + 1] - start
+            frame[indices[lo:hi]] = values[lo:hi]
+        return frame.reshape(self.shape)
+
+    def __iter__(self):
+        """Lazily iterate over the snapshots, applying one delta per step"""
+        size = 0 if self._last is None else self._last.size
+        for t in range(len(self)):
+            if t % self.keyframe_interval == 0:
+                k = t // self.keyframe_interval
+                frame = self._read("keyframes", k * size, size).copy()
+            else:
+                start, stop = self._offsets[t], self._offsets[t + 1]
+                frame[self._read("indices", start, stop - start)] = self._read(
+                    "values", start, stop - start
+                )
+            yield frame.reshape(self.shape).copy()
+
+    def _get_state(self):
+        """
+        Return the bookkeeping arrays needed to reopen the history on disk at its 
+        current length. The snapshots themselves are not included.
+        """
+        self.flush()
+        return {
+            "offsets": np.asarray(self._offsets), 
+            "last": self._last, 
+            "shape": np.asarray(self.shape)
+        }
+
+    def _set_state(self, offsets, last, shape):
+        """
+        Rewind the history to the length recorded by _get_state, and truncate the files
+        on disk to match, dropping any snapshots that were stored afterwards.
+        """
+        self._offsets = array("q", np.asarray(offsets).tolist())
+        self._last = np.asarray(last, dtype=np.uint8)
+        self.shape = tuple(shape)
+        n_keyframes = -(-len(self) // self.keyframe_interval)
+        lengths = {
+            "keyframes": n_keyframes * self._last.size, 
+            "indices": self._offsets[-1], 
+            "values": self._offsets[-1]
+        }
+        for name, length in lengths.items():
+            n_bytes = length * np.dtype(self._dtypes[name]).itemsize
+            if self.path is None:
+                del self._streams[name][n_bytes:]
+            else:
+                self._streams[name].flush()
+                self._streams[name].truncate(n_bytes)
+
+    def flush(self):
+        """Write any buffered snapshots to the files on disk"""
+        if self.path is not None:
+            for stream in self._streams.values():
+                stream.flush()
+
+    def close(self):
+        """Close the files used to store the history on disk"""
+        if self.path is not None:
+            for stream in self._streams.values():
+                stream.close()
+
+
+class AvalancheStatistics:
+    """
+    Streaming statistics of sandpile avalanches. Power-law distributed quantities span
+    many decades, and so we accumulate them into histograms with logarithmically-spaced
+    bins. The histograms are fixed-size arrays, and so the memory used does not grow 
+    with the number of avalanches. Collectors from independent runs with the same bins 
+    can be merged.
+
+    Parameters:
+        max_value (float): The upper edge of the last bin. Larger values are counted in
+            the last bin.
+        bins_per_decade (int): The number of bins per factor of ten
+
+    Attributes:
+        bins (np.ndarray): The bin edges, shared by all of the histograms
+        counts (dict): A histogram for each of the observables "size" (the number of
+            topple events), "area" (the number of distinct sites that toppled), 
+            "duration" (the number of parallel update waves) and "extent" (the linear
+            size of the bounding box of the toppled sites). Avalanches from engines 
+            that cannot measure waves are not counted in the duration histogram.
+        n_avalanches (int): The number of recorded avalanches
+    """
+
+    observables = ("size", "area", "duration", "extent")
+
+    def __init__(self, max_value=1e12, bins_per_decade=10):
+        self.bins_per_decade = bins_per_decade
+        n_bins = int(np.ceil(np.log10(max_value) * bins_per_decade))
+        self.bins = np.logspace(0, n_bins / bins_per_decade, n_bins + 1)
+        self.counts = {name: np.zeros(n_bins, dtype=np.int64) for name in self.observables}
+        self.n_avalanches = 0
+
+    def add(self, size, area, duration, extent):
+        """
+        Add a single avalanche to the histograms. All values must be at least one, 
+        except that a value of None is not counted.
+        """
+        n_bins = len(self.bins) - 1
+        for name, value in zip(self.observables, (size, area, duration, extent)):
+            if value is None:
+                continue
+            index = int(np.log10(value) * self.bins_per_decade)
+            self.counts[name][min(index, n_bins - 1)] += 1
+        self.n_avalanches += 1
+
+    def merge(self, other):
+        """
+        Add the histograms of another collector to this one.
+
+        Args:
+            other (AvalancheStatistics): A collector with the same bins
+
+        Returns:
+            self (AvalancheStatistics): The merged collector
+        """
+        if not np.array_equal(self.bins, other.bins):
+            raise ValueError("Cannot merge statistics with different bins")
+        for name in self.observables:
+            self.counts[name] += other.counts[name]
+        self.n_avalanches += other.n_avalanches
+        return self
+
+    def density(self, name):
+        """
+        The normalized probability density of one of the observables, which can be 
+        used to fit a power law.
+
+        Args:
+            name (str): One of "size", "area", "duration" or "extent"
+
+        Returns:
+            centers (np.ndarray): The geometric centers of the bins
+            density (np.ndarray): The probability density in each bin
+        """
+        centers = np.sqrt(self.bins[1:] * self.bins[:-1])
+        # Each histogram is normalized by its own total, since values of None are not
+        # counted
+        total = max(self.counts[name].sum(), 1)
+        density = self.counts[name] / (np.diff(self.bins) * total)
+        return centers, density
+
+
 class AbelianSandpile:
     """
     An Abelian sandpile model simulation. The sandpile is initialized with a random
@@ -13,24 +324,73 @@ class AbelianSandpile:
     
     Parameters:
         n (int): The size of the grid
+        random_state (int | np.random.Generator): The random seed. If a Generator is 
+            passed, it is used for all random draws instead of the global random state
         grid (np.ndarray): The grid of the sandpile
-        history (list): A list of the sandpile grids at each timestep
+        history (list): A list of the sandpile grids at each timestep. A SandpileHistory
+            can be passed to the constructor instead, in order to store the snapshots
+            in a compact, delta-encoded form.
         store_history (bool): Whether or not to store the history of the sandpile. Snapshots
             of the sandpile are stored between avalanche events
+        method (str): The relaxation engine used to topple the grid after a grain is 
+            dropped. "serial" topples one unstable site at a time, while "vectorized" 
+            topples every unstable site at once using whole-array shifts. "sparse" 
+            performs the same parallel update, but only inside the bounding box of
+            the unstable sites. "frontier" only visits the sites that topple, using a
+            breadth-first search over a preallocated ring buffer of unstable sites. 
+            Because the model is Abelian, every engine reaches the same stable grid.
+        store_avalanches (bool): Whether or not to store the statistics of every 
+            avalanche in the lists below. Long runs can turn this off, and rely on the
+            fixed-size histograms in statistics instead.
+        all_durations (list): The number of topple events in each avalanche
+        all_areas (list): The number of distinct sites toppled in each avalanche
+        all_generations (list): The number of parallel update waves in each avalanche.
+            This stays empty for engines that cannot measure waves.
+        statistics (AvalancheStatistics): Log-binned histograms of the avalanche size,
+            area, duration and linear extent
     """
 
+    # Map from the method keyword to the name of the relaxation engine. Subclasses can
+    # extend this dictionary to register additional engines.
+    _relax_methods = {
+        "serial": "_relax_serial", 
+        "vectorized": "_relax_vectorized", 
+        "sparse": "_relax_sparse",
+        "frontier": "_relax_frontier"
+    }
 
-    def __init__(self, n=100, random_state=None, store_history=True):
+    def __init__(
+        self, 
+        n=100, 
+        random_state=None, 
+        store_history=True, 
+        method="serial", 
+        history=None, 
+        store_avalanches=True
+    ):
         self.n = n
-        np.random.seed(random_state) # Set the random seed
-        self.grid = np.random.choice([0, 1, 2, 3], size=(n, n))
-        self.history =[self.grid.copy()] # Why did we need to copy the grid?
+        # An independent Generator leaves the global random state untouched
+        self.rng = _get_rng(random_state)
+        self.grid = self.rng.choice([0, 1, 2, 3], size=(n, n))
+        if history is None:
+            self.history =[self.grid.copy()] # Why did we need to copy the grid?
+        else:
+            self.history = history
+            self.history.append(self.grid)
         self.all_durations = list() # useful to keep track of the duration of toppling events
+        self.all_areas = list()
+        self.all_generations = list()
+        self.store_avalanches = store_avalanches
+        self.statistics = AvalancheStatistics()
         self.store_history = store_history
-        print(
-            "Running with Instructor Solutions. If you meant to run your own code, do not import from solutions", 
-            flush=True
-        )
+        if method not in self._relax_methods:
+            raise ValueError(
+                f"Unknown method {method}. Choose from {list(self._relax_methods)}"
+            )
+        self.method = method
+        self._relax = getattr(self, self._relax_methods[method])
+        self._queue = None # buffers of the frontier engine, allocated on first use
+        _notify_solutions()
 
     def step(self):
         """
@@ -45,16 +405,61 @@ class AbelianSandpile:
         Returns: None
         """
         # Pick a random location
-        xi, yi = np.random.choice(self.n, 2)
+        xi, yi = self.rng.choice(self.n, 2)
 
-        # Drop the grain and then topple the sand grains using an iterative solution:
-        # topple a site, then check the entire lattice for sites that need to be 
-        # toppled. Repeat until the sandpile is stable.
+        # Drop the grain and then relax the grid using the selected engine
         self.grid[xi, yi] += 1
-        duration = 0
+        self._record_avalanche(*self._relax(xi, yi))
+
+    def _record_avalanche(self, size, sites, duration):
+        """
+        Store the statistics of a single avalanche. Steps that do not cause any topple
+        events are not recorded.
+
+        Args:
+            size (int): The number of topple events
+            sites (np.ndarray): The flat indices of the distinct sites that toppled
+            duration (int): The number of parallel update waves, or None if the engine
+                cannot measure waves, in which case it is not recorded
+        """
+        if size == 0:
+            return None
+        area = len(sites)
+        rows, cols = np.divmod(sites, self.n)
+        extent = max(np.ptp(rows), np.ptp(cols)) + 1 # linear size of the bounding box
+        self.statistics.add(size, area, duration, extent)
+        if self.store_avalanches:
+            # all_durations has always counted topple events, and so it stores the size
+            self.all_durations.append(size)
+            self.all_areas.append(area)
+            if duration is not None:
+                self.all_generations.append(duration)
+
+    def _relax_serial(self, xi, yi):
+        """
+        Topple the sand grains using an iterative solution: topple a site, then check 
+        the entire lattice for sites that need to be toppled. Repeat until the sandpile 
+        is stable. Each topple costs a full scan of the lattice.
+
+        All relaxation engines share the same signature: they are called after a grain 
+        has been added at (xi, yi), and they return the avalanche statistics. Engines
+        that scan the whole lattice ignore the location of the grain.
+
+        Args:
+            xi (int): The row of the site that received the grain
+            yi (int): The column of the site that received the grain
+
+        Returns:
+            size (int): The number of topple events in the avalanche
+            sites (np.ndarray): The flat indices of the distinct sites that toppled
+            duration (None): The serial engine topples one site at a time, and so it
+                cannot measure the parallel update waves
+        """
+        toppled = np.zeros(self.grid.shape, dtype=bool)
+        size = 0
         while np.any(self.grid >= 4):
             topple_inds = np.where(self.grid >= 4) # find a high site
-            sel_ind = np.random.choice(np.arange(len(topple_inds[0])))
+            sel_ind = self.rng.choice(np.arange(len(topple_inds[0])))
             ii, jj = (topple_inds[0][sel_ind], topple_inds[1][sel_ind])
             self.grid[ii, jj] -= 4
             if ii > 0:
@@ -65,9 +470,250 @@ class AbelianSandpile:
                 self.grid[ii, jj - 1] += 1
             if jj < self.n - 1:
                 self.grid[ii, jj + 1] += 1
+            toppled[ii, jj] = True
+            size += 1
+        return size, np.flatnonzero(toppled), None
+
+    def _relax_vectorized(self, xi, yi):
+        """
+        Topple every unstable site at once using whole-array shifts. A site holding h 
+        grains topples h // 4 times in a single pass, and the grains it sheds are added 
+        to the four shifted copies of the lattice. Slicing drops the grains that would 
+        leave the grid, which implements the absorbing boundary conditions. Passes are 
+        repeated until the grid is stable.
+
+        Because the model is Abelian, the final grid and the total number of topples 
+        do not depend on the order in which sites are toppled, and so they match the 
+        serial engine.
+
+        Args:
+            xi (int): The row of the site that received the grain
+            yi (int): The column of the site that received the grain
+
+        Returns:
+            size (int): The number of topple events in the avalanche
+            sites (np.ndarray): The flat indices of the distinct sites that toppled
+            duration (int): The number of passes over the lattice
+        """
+        grid = self.grid
+        toppled = np.zeros(grid.shape, dtype=bool)
+        size, duration = 0, 0
+        topples = grid >> 2 # number of times each site topples in this pass
+        while np.any(topples):
+            size += int(topples.sum())
+            duration += 1
+            toppled |= topples > 0
+            grid -= 4 * topples
+            grid[1:] += topples[:-1]
+            grid[:-1] += topples[1:]
+            grid[:, 1:] += topples[:, :-1]
+            grid[:, :-1] += topples[:, 1:]
+            topples = grid >> 2
+        return size, np.flatnonzero(toppled), duration
+
+    def _relax_sparse(self, xi, yi):
+        """
+        Topple unstable sites in parallel, like the vectorized engine, but only inside
+        the bounding box of the currently unstable sites. Each pass topples the sites 
+        in the box, and adds the shed grains to the box grown by one site on each side. 
+        The next box is the bounding box of the sites that are unstable after the pass.
+        Sites outside the grown box are unchanged, and so they remain stable. The cost
+        of a pass therefore scales with the size of the avalanche rather than the size
+        of the lattice.
+
+        Args:
+            xi (int): The row of the site that received the grain
+            yi (int): The column of the site that received the grain
+
+        Returns:
+            size (int): The number of topple events in the avalanche
+            sites (np.ndarray): The flat indices of the distinct sites that toppled
+            duration (int): The number of passes over the bounding box
+        """
+        n, grid = self.n, self.grid
+        if grid[xi, yi] < 4:
+            return 0, np.zeros(0, dtype=np.int64), 0
+
+        # Bounding box of the unstable sites, as half-open row and column ranges
+        r0, r1, c0, c1 = xi, xi + 1, yi, yi + 1
+        size, duration = 0, 0
+        all_sites = list()
+        while True:
+            topples = grid[r0:r1, c0:c1] >> 2
+
+            # The region that receives grains, clipped to the lattice. Grains that 
+            # would leave the lattice are dropped by the slicing below.
+            R0, R1, C0, C1 = max(r0 - 1, 0), min(r1 + 1, n), max(c0 - 1, 0), min(c1 + 1, n)
+            region = grid[R0:R1, C0:C1] # a view, so writes update self.grid
+            shed = np.zeros(region.shape, dtype=grid.dtype)
+            shed[r0 - R0:r1 - R0, c0 - C0:c1 - C0] = topples
+            region -= 4 * shed
+            region[1:] += shed[:-1]
+            region[:-1] += shed[1:]
+            region[:, 1:] += shed[:, :-1]
+            region[:, :-1] += shed[:, 1:]
+
+            size += int(topples.sum())
             duration += 1
-        if duration > 0:
-            self.all_durations.append(duration)
+            rows, cols = np.nonzero(shed)
+            all_sites.append((rows + R0) * n + cols + C0)
+
+            rows, cols = np.nonzero(region >= 4)
+            if len(rows) == 0:
+                break
+            r0, r1 = R0 + rows.min(), R0 + rows.max() + 1
+            c0, c1 = C0 + cols.min(), C0 + cols.max() + 1
+
+        return size, np.unique(np.concatenate(all_sites)), duration
+
+    def _relax_frontier(self, xi, yi):
+        """
+        Relax the grid with a breadth-first search over unstable sites. The queue is a
+        preallocated ring buffer of flat site indices, and the in-queue bitmap ensures 
+        that each unstable site is stored only once. When a site is popped, it topples
+        as many times as its height allows.
+
+        Args:
+            xi (int): The row of the site that received the grain
+            yi (int): The column of the site that received the grain
+
+        Returns:
+            size (int): The number of topple events in the avalanche
+            sites (np.ndarray): The flat indices of the distinct sites that toppled
+            duration (int): The number of breadth-first waves
+        """
+        n = self.n
+        capacity = n * n
+        grid = self.grid.reshape(-1) # a flat view, so writes update self.grid
+
+        # Allocate the buffers on first use. Because a site can only appear once in the
+        # queue, n * n slots are always enough.
+        if self._queue is None:
+            self._queue = np.zeros(capacity, dtype=np.int64)
+            self._in_queue = np.zeros(capacity, dtype=bool)
+            self._toppled = np.zeros(capacity, dtype=bool)
+            self._frontier_sites = np.zeros(capacity, dtype=np.int64)
+        queue, in_queue = self._queue, self._in_queue
+        toppled, frontier_sites = self._toppled, self._frontier_sites
+
+        site = xi * n + yi
+        if grid[site] < 4:
+            return 0, frontier_sites[:0], 0
+        queue[0] = site
+        in_queue[site] = True
+
+        # head and tail count the total number of pops and pushes, and so the buffer
+        # positions are taken modulo the capacity
+        head, tail = 0, 1
+        wave_end = 1
+        size, area, duration = 0, 0, 0
+        while head < tail:
+            site = int(queue[head % capacity]) # Python ints index numpy arrays faster than numpy ints
+            head += 1
+            in_queue[site] = False
+
+            height = int(grid[site])
+            k = height >> 2 # number of topples
+            grid[site] = height & 3
+            size += k
+            if not toppled[site]:
+                toppled[site] = True
+                frontier_sites[area] = site
+                area += 1
+
+            i, j = divmod(site, n)
+            for neighbor, inside in (
+                (site - n, i > 0), 
+                (site + n, i < n - 1), 
+                (site - 1, j > 0), 
+                (site + 1, j < n - 1)
+            ):
+                if inside:
+                    height = grid[neighbor] + k
+                    grid[neighbor] = height
+                    if height >= 4 and not in_queue[neighbor]:
+                        queue[tail % capacity] = neighbor
+                        in_queue[neighbor] = True
+                        tail += 1
+
+            # All sites of the current wave have been popped
+            if head == wave_end:
+                duration += 1
+                wave_end = tail
+
+        # Reset only the entries of the bitmap that were touched by this avalanche
+        toppled[frontier_sites[:area]] = False
+        return int(size), frontier_sites[:area], duration
+
+    def save_checkpoint(self, path):
+        """
+        Save the state of the sandpile and of its random number generator to a 
+        compressed .npz file, so that a run can be resumed exactly with load_checkpoint.
+        The checkpoint includes the avalanche statistics. A history stored in a list is
+        not saved, but a SandpileHistory with a path records how many snapshots it 
+        held, so that it can be continued on disk after a restart.
+
+        Args:
+            path (str): The checkpoint file. numpy adds the .npz extension if missing.
+        """
+        state = {
+            "grid": self.grid,
+            "rng_state": _get_rng_state(self.rng),
+            "all_durations": np.asarray(self.all_durations, dtype=np.int64),
+            "all_areas": np.asarray(self.all_areas, dtype=np.int64),
+            "all_generations": np.asarray(self.all_generations, dtype=np.int64),
+            "statistics_bins": self.statistics.bins,
+            "statistics_n_avalanches": self.statistics.n_avalanches
+        }
+        for name in self.statistics.observables:
+            state[f"statistics_{name}"] = self.statistics.counts[name]
+        if isinstance(self.history, SandpileHistory) and self.history.path is not None:
+            for name, value in self.history._get_state().items():
+                state[f"history_{name}"] = value
+        np.savez_compressed(path, **state)
+
+    def load_checkpoint(self, path):
+        """
+        Restore the state of the sandpile and of its random number generator from a 
+        file written by save_checkpoint. The sandpile must have the same size, and the
+        same kind of random number generator, as the sandpile that was saved. To 
+        continue a history stored on disk, construct the sandpile with 
+        SandpileHistory(path=..., append=True) before loading the checkpoint.
+
+        Args:
+            path (str): The checkpoint file.
+
+        Returns:
+            self (AbelianSandpile): The restored sandpile
+        """
+        with np.load(path) as checkpoint:
+            if checkpoint["grid"].shape != self.grid.shape:
+                raise ValueError("The checkpoint has a different grid size")
+            self.grid = checkpoint["grid"].copy()
+            _set_rng_state(self.rng, checkpoint["rng_state"])
+            self.all_durations = checkpoint["all_durations"].tolist()
+            self.all_areas = checkpoint["all_areas"].tolist()
+            self.all_generations = checkpoint["all_generations"].tolist()
+
+            if not np.array_equal(checkpoint["statistics_bins"], self.statistics.bins):
+                raise ValueError("The checkpoint has different statistics bins")
+            for name in self.statistics.observables:
+                self.statistics.counts[name] = checkpoint[f"statistics_{name}"].copy()
+            self.statistics.n_avalanches = int(checkpoint["statistics_n_avalanches"])
+
+            if isinstance(self.history, SandpileHistory):
+                if "history_offsets" in checkpoint:
+                    self.history._set_state(
+                        checkpoint["history_offsets"], 
+                        checkpoint["history_last"], 
+                        checkpoint["history_shape"]
+                    )
+                else:
+                    self.history._set_state([0], self.grid, self.grid.shape)
+                    self.history.append(self.grid)
+            else:
+                self.history = [self.grid.copy()]
+        return self
 
     # we use this decorator for class methods that don't require any of the attributes 
     # stored in self. Notice how we don't pass self to the method
@@ -77,19 +723,138 @@ class AbelianSandpile:
         return np.sum(grid1 != grid2)
 
     
-    def simulate(self, n_step):
+    def simulate(
+        self, n_step, drive="single", sites=None, batch_size=None, save_every=None
+    ):
         """
         Simulate the sandpile model for n_step steps.
+
+        Args:
+            n_step (int): The number of grains to drop
+            drive (str): How the grains are added to the grid. "single" calls step() 
+                once per grain, and compares the whole grid to the last snapshot after
+                every step. "batch" adds batch_size grains at once with np.add.at and 
+                then relaxes the grid once with the vectorized engine. Because the 
+                model is Abelian, the final grid is the same, but statistics of 
+                individual avalanches are not recorded. "exact" drops the grains one at 
+                a time and relaxes each one with the frontier engine, so that the cost 
+                of a grain scales with the size of its avalanche rather than the size 
+                of the lattice, as long as snapshots are stored rarely (see save_every).
+                In every mode, snapshots are only stored if store_history is True.
+            sites (np.ndarray): An array of shape (n_step, 2) with the drop sites. If
+                None, the sites are drawn at random before the simulation starts.
+            batch_size (int): The number of grains added per relaxation in "batch"
+                mode. Defaults to adding all n_step grains at once. A snapshot is 
+                stored after every batch.
+            save_every (int): The number of grains between stored snapshots in "exact"
+                mode. Every snapshot copies the whole lattice, and so if None, only the
+                final grid is stored.
+
+        Returns:
+            np.ndarray: The final grid
         """
-        # YOUR CODE HERE. You should use the step method you wrote above.
-        for i in range(n_step):
-            self.step()
-            if self.check_difference(self.grid, self.history[-1]) > 0:
+        if drive == "single":
+            # YOUR CODE HERE. You should use the step method you wrote above.
+            for i in range(n_step):
+                self.step()
+                if not self.store_history:
+                    continue
+                if self.check_difference(self.grid, self.history[-1]) > 0:
+                    self.history.append(self.grid.copy())
+            return self.grid
+
+        if sites is None:
+            sites = self.rng.choice(self.n, size=(n_step, 2))
+        sites = np.asarray(sites)
+        assert sites.shape == (n_step, 2), "sites must have shape (n_step, 2)"
+
+        if drive == "batch":
+            batch_size = n_step if batch_size is None else batch_size
+            for start in range(0, n_step, batch_size):
+                batch = sites[start:start + batch_size]
+                np.add.at(self.grid, (batch[:, 0], batch[:, 1]), 1)
+                self._relax_vectorized(None, None)
+                if self.store_history:
+                    self.history.append(self.grid.copy())
+
+        elif drive == "exact":
+            for k, (xi, yi) in enumerate(sites.tolist()):
+                self.grid[xi, yi] += 1
+                self._record_avalanche(*self._relax_frontier(xi, yi))
+                if self.store_history and save_every and (k + 1) % save_every == 0:
+                    self.history.append(self.grid.copy())
+            # Always store the final grid, unless it was the last snapshot
+            if self.store_history and n_step > 0 and (
+                not save_every or n_step % save_every != 0
+            ):
                 self.history.append(self.grid.copy())
+
+        else:
+            raise ValueError(f"Unknown drive {drive}. Choose from single, batch, exact")
         return self.grid
 
 
 
+def _simulate_replica(args):
+    """
+    Run one replica of a sandpile ensemble. This function is defined at the module 
+    level so that it can be sent to worker processes.
+    """
+    seed, n_step, drive, kwargs = args
+    # Only the avalanche statistics are returned, and so the history is never stored
+    kwargs = {**kwargs, "store_history": False}
+    model = AbelianSandpile(random_state=np.random.default_rng(seed), **kwargs)
+    model.simulate(n_step, drive=drive)
+    sizes = np.array(model.all_durations, dtype=np.int64)
+    return sizes, np.bincount(sizes), model.statistics
+
+
+def simulate_ensemble(n_replicas, n_step, seed=None, max_workers=None, drive="exact", **kwargs):
+    """
+    Simulate independent sandpiles in parallel across a pool of processes. Each replica
+    gets its own random Generator, spawned from a single SeedSequence, so that the 
+    replicas are statistically independent and the ensemble is reproducible.
+
+    Args:
+        n_replicas (int): The number of independent sandpiles
+        n_step (int): The number of grains dropped on each sandpile
+        seed (int): The seed of the SeedSequence used to spawn the replica generators
+        max_workers (int): The number of worker processes. If 1, the replicas are run 
+            in the current process. The replicas are also run in the current process 
+            if this module was loaded with exec rather than imported, since worker 
+            processes can then not find the function that runs each replica.
+        drive (str): The drive mode passed to AbelianSandpile.simulate
+        **kwargs: Additional arguments passed to AbelianSandpile, such as n or method.
+            The history of the replicas is never stored.
+
+    Returns:
+        durations (np.ndarray): The merged all_durations of every replica
+        size_counts (np.ndarray): The merged histogram of avalanche sizes, where entry s
+            is the number of avalanches with s topple events
+        statistics (AvalancheStatistics): The merged log-binned histograms
+    """
+    seeds = np.random.SeedSequence(seed).spawn(n_replicas)
+    args = [(child, n_step, drive, kwargs) for child in seeds]
+    try:
+        pickle.dumps(_simulate_replica)
+        picklable = True
+    except (pickle.PicklingError, AttributeError, TypeError):
+        picklable = False
+    if max_workers == 1 or not picklable:
+        results = list(map(_simulate_replica, args))
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_simulate_replica, args))
+
+    durations = np.concatenate([sizes for sizes, _, _ in results])
+    size_counts = np.zeros(max(len(counts) for _, counts, _ in results), dtype=np.int64)
+    statistics = AvalancheStatistics()
+    for _, counts, replica_statistics in results:
+        size_counts[:len(counts)] += counts
+        statistics.merge(replica_statistics)
+    return durations, size_counts, statistics
+
+
 class AbelianSandpileIterative(AbelianSandpile):
     """
     An Abelian sandpile model simulation. The sandpile is initialized with a random
@@ -99,6 +864,8 @@ class AbelianSandpileIterative(AbelianSandpile):
     
     Parameters:
         n (int): The size of the grid
+        random_state (int | np.random.Generator): The random seed, or a Generator that
+            is used for all random draws
         grid (np.ndarray): The grid of the sandpile
         history (list): A list of the sandpile grids at each timestep
         store_history (bool): Whether or not to store the history of the sandpile. Snapshots
@@ -106,52 +873,10 @@ class AbelianSandpileIterative(AbelianSandpile):
     """
 
 
-    def __init__(self, n=100, random_state=None):
-        super().__init__(n, random_state)
-        self.n = n
-        np.random.seed(random_state) # Set the random seed
-        self.grid = np.random.choice([0, 1, 2, 3], size=(n, n))
-        self.history =[self.grid.copy()] # Why did we need to copy the grid?
-        self.all_durations = list() # useful to keep track of the duration of toppling events
-
-    def step(self):
-        """
-        Perform a single step of the sandpile model. Recall that there are two 
-        timescales in this problem; step corresponds to the longer timescale of a 
-        single sandgrain addition.
-
-        A single step of the simulation consists of two stages: a random sand grain is 
-        dropped onto the lattice at a random location. Then, a set of avalanches occurs
-        causing sandgrains to get redistributed to their neighboring locations.
-
-        Returns: None
-        """
-        # Pick a random location
-        xi, yi = np.random.choice(self.n, 2)
-
-        # Drop the grain and then topple the sand grains using an iterative solution:
-        # topple a site, then check the entire lattice for sites that need to be 
-        # toppled. Repeat until the sandpile is stable.
-        self.grid[xi, yi] += 1
-        duration = 0
-        while np.any(self.grid >= 4):
-            topple_inds = np.where(self.grid >= 4) # find a high site
-            sel_ind = np.random.choice(np.arange(len(topple_inds[0])))
-            ii, jj = (topple_inds[0][sel_ind], topple_inds[1][sel_ind])
-            self.grid[ii, jj] -= 4
-            if ii > 0:
-                self.grid[ii - 1, jj] += 1
-            if ii < self.n - 1:
-                self.grid[ii + 1, jj] += 1
-            if jj > 0:
-                self.grid[ii, jj - 1] += 1
-            if jj < self.n - 1:
-                self.grid[ii, jj + 1] += 1
-            duration += 1
-        if duration > 0:
-            self.all_durations.append(duration)
-
-
+    def __init__(self, n=100, random_state=None, **kwargs):
+        # The iterative solution is the serial relaxation engine of the parent class, 
+        # which topples one site at a time and then scans the lattice again
+        super().__init__(n=n, random_state=random_state, method="serial", **kwargs)
 
 
 class AbelianSandpileDFS(AbelianSandpile):
@@ -159,17 +884,42 @@ class AbelianSandpileDFS(AbelianSandpile):
     An alternative implementation of the Abelian Sandpile model using a depth-first
     search algorithm to find all sites that need to be toppled.
 
+    The "recursive" engine makes one recursive call for every grain handed to a 
+    neighbor, and so large avalanches can exceed Python's recursion limit. The "stack"
+    engine performs the same depth-first search with an explicit, preallocated stack of
+    flat site indices. A per-site bitmap keeps each unstable site on the stack at most
+    once, so the stack never holds more than n * n entries. Because the model is 
+    Abelian, both engines give the same final grid.
+
     Parameters:
         n (int): The size of the grid
         grid (np.ndarray): The grid of the sandpile
         history (list): A list of the sandpile grids at each timestep
         store_history (bool): Whether or not to store the history of the sandpile. Snapshots
             of the sandpile are stored between avalanche events
+        method (str): The relaxation engine, either "recursive" or "stack". The engines
+            of the parent class are also available.
+        topple_counts (np.ndarray): The number of times each site toppled during the
+            most recent avalanche
     """
 
+    _relax_methods = {
+        **AbelianSandpile._relax_methods, 
+        "recursive": "_relax_recursive", 
+        "stack": "_relax_stack"
+    }
+
+    def __init__(self, method="recursive", **kwargs):
+        super().__init__(method=method, **kwargs)
+        self.topple_counts = np.zeros((self.n, self.n), dtype=np.int64)
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
+        # Flat indices of the sites stored in topple_counts, so that the counts can be
+        # reset without touching the whole lattice
+        self._toppled_sites = np.zeros(self.n * self.n, dtype=np.int64)
+        self._n_toppled = 0
+        if method == "stack":
+            self._stack = np.zeros(self.n * self.n, dtype=np.int64)
+            self._in_stack = np.zeros(self.n * self.n, dtype=bool)
 
     def _add_and_topple(self, i, j):
         """
@@ -187,6 +937,7 @@ class AbelianSandpileDFS(AbelianSandpile):
         else:
             # Decrease the height of the site
             self.grid[i, j] -= 4
+            self._count_topples(i * self.n + j, 1)
 
             # Implement the absorbing boundary conditions: sandgrains
             # that fall off the edge of the grid are lost.
@@ -200,22 +951,96 @@ class AbelianSandpileDFS(AbelianSandpile):
                 self._add_and_topple(i, j + 1)
             return None
 
-    def step(self):
+    def _count_topples(self, site, k):
+        """Add k topples of the site with flat index site to the topple counts"""
+        counts = self.topple_counts.reshape(-1)
+        if counts[site] == 0:
+            self._toppled_sites[self._n_toppled] = site
+            self._n_toppled += 1
+        counts[site] += k
+
+    def _reset_topple_counts(self):
+        """Clear the topple counts left over from the previous avalanche"""
+        counts = self.topple_counts.reshape(-1)
+        counts[self._toppled_sites[:self._n_toppled]] = 0
+        self._n_toppled = 0
+
+    def _relax_recursive(self, xi, yi):
         """
-        Perform a single step of the sandpile model. Recall that there are two 
-        timescales in this problem; step corresponds to the longer timescale of a 
-        single sandgrain addition.
+        Relax the grid using the recursive depth-first search.
 
-        A single step of the simulation consists of two stages: a random sand grain is 
-        dropped onto the lattice at a random location. Then, a set of avalanches occurs
-        causing sandgrains to get redistributed to their neighboring locations.
+        Args:
+            xi (int): The row of the site that received the grain
+            yi (int): The column of the site that received the grain
 
-        Returns: None
+        Returns:
+            size (int): The number of topple events in the avalanche
+            sites (np.ndarray): The flat indices of the distinct sites that toppled
+            duration (None): The depth-first search does not measure parallel update
+                waves
         """
-        # Pick a random location
-        xi, yi = np.random.choice(self.n, 2)
-        # Call the recursive topple function
+        self._reset_topple_counts()
+        # The grain has already been dropped, but the recursive function adds the grain
+        # itself, so we remove it first
+        self.grid[xi, yi] -= 1
         self._add_and_topple(xi, yi)
+        size = int(self.topple_counts.reshape(-1)[self._toppled_sites[:self._n_toppled]].sum())
+        return size, self._toppled_sites[:self._n_toppled], None
+
+    def _relax_stack(self, xi, yi):
+        """
+        Relax the grid using a depth-first search with an explicit stack. When a site 
+        is popped, it topples as many times as its height allows, and any neighbor 
+        that becomes unstable is pushed onto the stack.
+
+        Args:
+            xi (int): The row of the site that received the grain
+            yi (int): The column of the site that received the grain
+
+        Returns:
+            size (int): The number of topple events in the avalanche
+            sites (np.ndarray): The flat indices of the distinct sites that toppled
+            duration (None): The depth-first search does not measure parallel update
+                waves
+        """
+        self._reset_topple_counts()
+        n = self.n
+        grid = self.grid.reshape(-1) # a flat view, so writes update self.grid
+        stack, in_stack = self._stack, self._in_stack
+
+        site = xi * n + yi
+        if grid[site] < 4:
+            return 0, self._toppled_sites[:0], None
+        stack[0] = site
+        in_stack[site] = True
+        top = 1
+        while top > 0:
+            top -= 1
+            site = int(stack[top])
+            in_stack[site] = False
+
+            height = int(grid[site])
+            k = height >> 2 # number of topples
+            grid[site] = height & 3
+            self._count_topples(site, k)
+
+            i, j = divmod(site, n)
+            for neighbor, inside in (
+                (site - n, i > 0), 
+                (site + n, i < n - 1), 
+                (site - 1, j > 0), 
+                (site + 1, j < n - 1)
+            ):
+                if inside:
+                    height = grid[neighbor] + k
+                    grid[neighbor] = height
+                    if height >= 4 and not in_stack[neighbor]:
+                        stack[top] = neighbor
+                        in_stack[neighbor] = True
+                        top += 1
+
+        size = int(self.topple_counts.reshape(-1)[self._toppled_sites[:self._n_toppled]].sum())
+        return size, self._toppled_sites[:self._n_toppled], None
 
 
 from collections import deque
@@ -231,63 +1056,216 @@ class AbelianSandpileBFS(AbelianSandpile):
     We therefore define a separate history attribute in order to record the fast-timescale 
     topple events that occur between grain additions.
 
+    Two breadth-first engines are available. The "deque" engine stores every grain 
+    transfer as a tuple in a queue, and so the same site can be enqueued many times. 
+    The "frontier" engine, inherited from the parent class, stores only the pending 
+    unstable sites as flat indices in a preallocated ring buffer, and a per-site bitmap 
+    prevents a site from being enqueued twice. Both engines report the same avalanche 
+    size and area. The duration counts breadth-first waves, and it can differ slightly 
+    between the two engines when a site accumulates enough grains to topple more than 
+    once. Snapshots of the topple events can only be stored by the "deque" engine.
+
     Parameters:
         n (int): The size of the grid
         grid (np.ndarray): The grid of the sandpile
         history (list): A list of the sandpile grids at each timestep
         store_history (bool): Whether or not to store the history of the sandpile. Snapshots
             of the sandpile are stored between avalanche events
+        method (str): The relaxation engine. Defaults to "deque", and the engines of 
+            the parent class are also available.
     """
 
-    def __init__(self, store_topple_history=False, **kwargs):
-        super().__init__(**kwargs)
+    _relax_methods = {**AbelianSandpile._relax_methods, "deque": "_relax_deque"}
+
+    def __init__(self, store_topple_history=False, method="deque", **kwargs):
+        if store_topple_history and method != "deque":
+            raise ValueError("Topple histories are only stored by the deque method")
+        super().__init__(method=method, **kwargs)
         self.store_topple_history = store_topple_history
         if store_topple_history:
             self.history_topples = [self.grid.copy()]
 
-    def step(self):
+    def _relax_deque(self, xi, yi):
         """
-        Perform a single step of the sandpile model. Recall that there are two 
-        timescales in this problem; step corresponds to the longer timescale of a 
-        single sandgrain addition.
+        Relax the grid with a breadth-first search over individual grain transfers.
 
-        A single step of the simulation consists of two stages: a random sand grain is 
-        dropped onto the lattice at a random location. Then, a set of avalanches occurs
-        causing sandgrains to get redistributed to their neighboring locations.
+        Args:
+            xi (int): The row of the site that received the grain
+            yi (int): The column of the site that received the grain
 
-        Returns: None
+        Returns:
+            size (int): The number of topple events in the avalanche
+            sites (np.ndarray): The flat indices of the distinct sites that toppled
+            duration (int): The number of breadth-first waves
         """
-        # Pick a random location
-        xi, yi = np.random.choice(self.n, 2)
+        # The grain has already been dropped, but the search adds each grain when it is
+        # popped from the queue, so we remove it first
+        self.grid[xi, yi] -= 1
 
-        # A queue data structure stores a list of sites that need to be toppled.
+        # A queue data structure stores a list of sites that will receive a grain, and
+        # so need to be checked for toppling.
         queue = deque([(xi, yi)])
+        toppled = set()
+        size, duration = 0, 0
+
+        # Keep track of how many entries belong to the current wave of the search
+        wave_remaining, wave_next = 1, 0
+        wave_toppled = False
         
         # Perform a breadth-first search to find all sites that need to be toppled
         # the while loop will continue until the queue is empty
         while queue:
             # the popleft() method removes the first element from the queue
             i, j = queue.popleft()
+            wave_remaining -= 1
             self.grid[i, j] += 1 # global state update
 
-            # Base case
-            if self.grid[i, j] < 4:
-                continue
+            # Sites below the threshold are the base case, and do not topple
+            if self.grid[i, j] >= 4:
         
-            # Store a snapshot if a topple event occurs
-            if self.store_topple_history:
-                self.history_topples.append(self.grid.copy())
+                # Store a snapshot if a topple event occurs
+                if self.store_topple_history:
+                    self.history_topples.append(self.grid.copy())
 
-            # Decrease the height of the site
-            self.grid[i, j] -= 4
+                # Decrease the height of the site
+                self.grid[i, j] -= 4
+                size += 1
+                toppled.add((i, j))
+                wave_toppled = True
 
-            # Implement the absorbing boundary conditions: sand grains
-            # that fall off the edge of the grid are lost.
-            if i > 0:
-                queue.append((i - 1, j))
-            if i < self.n - 1:
-                queue.append((i + 1, j))
-            if j > 0:
-                queue.append((i, j - 1))
-            if j < self.n - 1:
-                queue.append((i, j + 1))
+                # Implement the absorbing boundary conditions: sand grains
+                # that fall off the edge of the grid are lost.
+                for ii, jj in ((i - 1, j), (i + 1, j), (i, j - 1), (i, j + 1)):
+                    if 0 <= ii < self.n and 0 <= jj < self.n:
+                        queue.append((ii, jj))
+                        wave_next += 1
+
+            if wave_remaining == 0:
+                duration += wave_toppled
+                wave_remaining, wave_next = wave_next, 0
+                wave_toppled = False
+
+        sites = np.array([i * self.n + j for i, j in toppled], dtype=np.int64)
+        return size, sites, duration
+
+
+from scipy.fft import dstn, idstn
+class SandpileGroup(AbelianSandpile):
+    """
+    The sandpile group of the n x n grid with absorbing boundaries. The recurrent 
+    configurations of the sandpile form an abelian group, in which two configurations
+    are added site by site and then stabilized. The group has an identity element, 
+    which forms a striking fractal pattern on large grids.
+
+    Stabilizing a large configuration one topple at a time is slow, and so we instead 
+    compute the odometer: the number of times that each site topples. Because a 
+    stable site holds at most 3 grains, solving the discrete Poisson equation for the
+    configuration minus 3 gives a lower bound on the odometer. By the least action 
+    principle, we can perform all of these topples at once without changing the final
+    configuration. We then finish the stabilization with bulk passes, in which every 
+    unstable site topples h // 4 times.
+
+    Parameters:
+        n (int): The size of the grid
+        grid (np.ndarray): The grid of the sandpile, which add_grains stabilizes in place
+    """
+
+    def __init__(self, n=100, **kwargs):
+        super().__init__(n=n, **kwargs)
+
+        # Eigenvalues of the Laplacian with absorbing boundaries, which is diagonalized 
+        # by the type-I discrete sine transform
+        k = np.pi * np.arange(1, n + 1) / (n + 1)
+        self._eigenvalues = 4 - 2 * np.cos(k)[:, None] - 2 * np.cos(k)[None, :]
+
+    @staticmethod
+    def _laplacian(u):
+        """The graph Laplacian of the grid, with absorbing boundaries"""
+        result = 4 * u
+        result[1:] -= u[:-1]
+        result[:-1] -= u[1:]
+        result[:, 1:] -= u[:, :-1]
+        result[:, :-1] -= u[:, 1:]
+        return result
+
+    def stabilize(self, config):
+        """
+        Stabilize a configuration.
+
+        Args:
+            config (np.ndarray): An n x n array of non-negative grain counts
+
+        Returns:
+            stable (np.ndarray): The stabilized configuration
+            odometer (np.ndarray): The number of times that each site toppled
+        """
+        config = np.asarray(config, dtype=np.int64)
+
+        # Lower bound on the odometer. We subtract a small margin before rounding down,
+        # so that floating point errors cannot push the bound above the true value.
+        bound = idstn(dstn(config - 3.0, type=1) / self._eigenvalues, type=1)
+        odometer = np.maximum(np.floor(bound - 1e-6), 0).astype(np.int64)
+
+        # Finish with bulk passes. The remaining heights and topple counts are small, 
+        # and so we use 32-bit integers and preallocated buffers to reduce the memory 
+        # traffic of each pass.
+        grid = (config - self._laplacian(odometer)).astype(np.int32)
+        remaining = np.zeros(grid.shape, dtype=np.int32)
+        topples, shed = np.empty_like(grid), np.empty_like(grid)
+        while True:
+            np.right_shift(grid, 2, out=topples)
+            if not np.any(topples):
+                break
+            remaining += topples
+            np.left_shift(topples, 2, out=shed)
+            grid -= shed
+            grid[1:] += topples[:-1]
+            grid[:-1] += topples[1:]
+            grid[:, 1:] += topples[:, :-1]
+            grid[:, :-1] += topples[:, 1:]
+        return grid.astype(np.int64), odometer + remaining
+
+    def add(self, config1, config2):
+        """Add two configurations in the sandpile group"""
+        return self.stabilize(np.asarray(config1) + np.asarray(config2))[0]
+
+    def identity(self):
+        """
+        Compute the identity element of the sandpile group. If c is the configuration
+        with 6 grains on every site, the identity is the stabilization of c minus the 
+        stabilization of c.
+        """
+        full = np.full((self.n, self.n), 6, dtype=np.int64)
+        return self.stabilize(full - self.stabilize(full)[0])[0]
+
+    def is_recurrent(self, config):
+        """
+        Check whether a stable configuration is recurrent, using the burning algorithm.
+        We add one grain for every edge between a site and the boundary. The 
+        configuration is recurrent if and only if every site then topples exactly once.
+        """
+        burn = np.zeros((self.n, self.n), dtype=np.int64)
+        burn[0] += 1
+        burn[-1] += 1
+        burn[:, 0] += 1
+        burn[:, -1] += 1
+        odometer = self.stabilize(np.asarray(config) + burn)[1]
+        return bool(np.all(odometer == 1))
+
+    def add_grains(self, n_grains, site=None):
+        """
+        Add many grains to a single site of self.grid, and stabilize the grid in place.
+
+        Args:
+            n_grains (int): The number of grains to add
+            site (tuple): The site that receives the grains. Defaults to the center.
+
+        Returns:
+            np.ndarray: The number of times that each site toppled
+        """
+        if site is None:
+            site = (self.n // 2, self.n // 2)
+        config = self.grid.copy()
+        config[site] += n_grains
+        self.grid, odometer = self.stabilize(config)
+        return odometer
@@ -1,11 +1,335 @@
 import numpy as np
+import json
+import math
+
+
+def _get_rng(random_state):
+    """
+    Return the random number generator used by a simulation. A Generator is used as-is,
+    an integer seeds the global random state, and None uses the global random state
+    without resetting it.
+    """
+    if isinstance(random_state, np.random.Generator):
+        return random_state
+    if random_state is not None:
+        np.random.seed(random_state)
+    return np.random
+
+
+def _get_rng_state(rng):
+    """
+    Return the state of a random number generator as a JSON string, which can be stored
+    in an npz file without pickling. The global random state is used for numpy.random.
+    """
+    if isinstance(rng, np.random.Generator):
+        state = rng.bit_generator.state
+    else:
+        state = np.random.get_state(legacy=False)
+    return json.dumps(state, default=lambda x: x.tolist())
+
+
+def _set_rng_state(rng, state):
+    """Restore the state of a random number generator saved by _get_rng_state"""
+    state = json.loads(str(state))
+    if "key" in state["state"]:
+        # The Mersenne Twister key is stored as a list
+        state["state"]["key"] = np.array(state["state"]["key"], dtype=np.uint32)
+    if isinstance(rng, np.random.Generator):
+        rng.bit_generator.state = state
+    else:
+        np.random.set_state(state)
+
+
+def random_unit_vecs(K, rng=np.random, out=None):
+    """
+    Draw random unit vectors, uniformly distributed on S^2. The height z is uniform on
+    [-1, 1] and the azimuth phi is uniform on [0, 2 pi), which is uniform on the sphere
+    by Archimedes' hat-box theorem.
+
+    Args:
+        K (int | tuple): The number of vectors, or the shape of the array of vectors.
+        rng (np.random.Generator): The random number generator. Defaults to the global
+            numpy random state.
+        out (np.ndarray): Optional preallocated output array (shape (*K, 3)).
+
+    Returns:
+        np.ndarray: The unit vectors (shape (*K, 3)).
+    """
+    z = rng.uniform(-1.0, 1.0, size=K)
+    phi = rng.uniform(0.0, 2.0 * np.pi, size=K)
+    if out is None:
+        out = np.empty(np.shape(z) + (3,))
+    out[..., 2] = z
+    # Overwrite z with the radius of the circle of latitude at height z
+    r = z
+    np.multiply(z, z, out=r)
+    np.subtract(1.0, r, out=r)
+    np.maximum(r, 0.0, out=r)
+    np.sqrt(r, out=r)
+    np.cos(phi, out=out[..., 0])
+    out[..., 0] *= r
+    np.sin(phi, out=out[..., 1])
+    out[..., 1] *= r
+    return out
+
 
 def random_unit_vec():
     """Return a random unit vector on S^2 (shape (3,))."""
-    z = np.random.uniform(-1.0, 1.0)
-    phi = np.random.uniform(0.0, 2.0 * np.pi)
-    r = np.sqrt(max(0.0, 1.0 - z * z))
-    return np.array([r * np.cos(phi), r * np.sin(phi), z], dtype=float)
+    return random_unit_vecs(1)[0]
+
+
+def rotate(v, axes, angles, out=None):
+    """
+    Rotate each vector in v about the matching unit axis by the matching angle, by 
+    Rodrigues' formula, and re-normalize to guard against floating-point drift. The 
+    arrays are broadcast against each other, so that a single axis and angle can rotate
+    many vectors.
+
+    Args:
+        v (np.ndarray): Vectors to rotate (shape (..., 3)).
+        axes (np.ndarray): Unit axes of rotation (shape (..., 3)).
+        angles (float | np.ndarray): Angles of rotation in radians (shape (...)).
+        out (np.ndarray): Optional preallocated output array, which may be v itself in
+            order to rotate in place.
+
+    Returns:
+        np.ndarray: The rotated vectors.
+    """
+    angles = np.asarray(angles, dtype=float)[..., None]
+    # Both terms that depend on v are computed before out is written, so that out 
+    # can be v
+    cross = np.cross(axes, v)
+    dots = np.sum(axes * v, axis=-1, keepdims=True)
+    if out is None:
+        out = np.empty(np.broadcast_shapes(np.shape(v), np.shape(axes)))
+    c = np.cos(angles)
+    np.multiply(v, c, out=out)
+    cross *= np.sin(angles)
+    out += cross
+    dots *= 1.0 - c
+    out += axes * dots
+    out /= np.linalg.norm(out, axis=-1, keepdims=True)
+    return out
+
+
+def _autocorrelation(t):
+    """
+    Compute C(s) = <t_i · t_{i+s}> averaged over i, for every separation s, using the 
+    FFT of each component of the tangent vectors t (shape (N, 3)). The chain is 
+    zero-padded to twice its length, so that the FFT does not wrap around.
+    """
+    n = len(t)
+    spectrum = np.fft.rfft(t, n=2 * n, axis=0)
+    power = np.sum(np.abs(spectrum) ** 2, axis=1)
+    sums = np.fft.irfft(power, n=2 * n)[:n]
+    return sums / np.arange(n, 0, -1)
+
+
+class RunningStatistics:
+    """
+    Accumulate the mean and variance of a stream of observables in fixed memory.
+
+    The mean and variance are updated with Welford's algorithm. Because consecutive 
+    Monte Carlo samples are correlated, the standard error is estimated from batch 
+    means, which are the averages of consecutive, non-overlapping batches of samples.
+
+    Parameters:
+        shape (tuple): The shape of each sample.
+        batch_size (int): The number of consecutive samples in each batch.
+
+    Attributes:
+        count (int): The number of samples.
+        mean (np.ndarray): The running mean of the samples.
+        var (np.ndarray): The running variance of the samples.
+        error (np.ndarray): The standard error of the mean, from the batch means. This 
+            is nan until at least two batches have been completed.
+    """
+
+    def __init__(self, shape=(), batch_size=100):
+        self.shape = shape
+        self.batch_size = int(batch_size)
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self._m2 = np.zeros(shape)
+        # The running sum of the current batch, and Welford sums over the batch means
+        self._batch_sum = np.zeros(shape)
+        self.n_batches = 0
+        self._batch_mean = np.zeros(shape)
+        self._batch_m2 = np.zeros(shape)
+
+    def add(self, x):
+        """Add a single sample."""
+        x = np.asarray(x, dtype=float)
+        self.count += 1
+        delta = x - self.mean
+        self.mean = self.mean + delta / self.count
+        self._m2 = self._m2 + delta * (x - self.mean)
+
+        self._batch_sum = self._batch_sum + x
+        if self.count % self.batch_size == 0:
+            batch = self._batch_sum / self.batch_size
+            self._batch_sum = np.zeros(self.shape)
+            self.n_batches += 1
+            delta = batch - self._batch_mean
+            self._batch_mean = self._batch_mean + delta / self.n_batches
+            self._batch_m2 = self._batch_m2 + delta * (batch - self._batch_mean)
+
+    @property
+    def var(self):
+        return self._m2 / max(self.count - 1, 1)
+
+    @property
+    def error(self):
+        if self.n_batches < 2:
+            return np.full(self.shape, np.nan)[()]
+        return np.sqrt(self._batch_m2 / (self.n_batches - 1) / self.n_batches)
+
+    @property
+    def autocorrelation_time(self):
+        """
+        The integrated autocorrelation time of the samples, from the ratio of the 
+        variance of the batch means to the variance of the samples. Independent samples
+        give 1/2, and correlated samples give roughly half the number of samples 
+        between independent samples.
+        """
+        if self.n_batches < 2:
+            return np.full(self.shape, np.nan)[()]
+        batch_var = self._batch_m2 / (self.n_batches - 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return 0.5 * self.batch_size * batch_var / self.var
+
+
+def integrated_autocorrelation_time(x, window=5.0):
+    """
+    Estimate the integrated autocorrelation time tau = 1/2 + sum_t rho(t) of a time 
+    series, using Sokal's automatic window, which sums the normalized autocorrelation 
+    function rho(t) up to the first lag M with M >= window * tau(M).
+
+    Args:
+        x (np.ndarray): A time series (shape (T,)).
+        window (float): The window constant. Larger values reduce the bias of the 
+            estimate, at the cost of more noise.
+
+    Returns:
+        float: The integrated autocorrelation time, in units of the sampling interval.
+    """
+    x = np.asarray(x, dtype=float)
+    x = x - np.mean(x)
+    rho = _autocorrelation(x[:, None])
+    if rho[0] == 0.0:
+        return 0.5
+    rho = rho / rho[0]
+    tau = np.cumsum(rho) - 0.5
+    lags = np.arange(len(rho))
+    within = lags < window * tau
+    cutoff = np.argmin(within) if not np.all(within) else len(rho) - 1
+    return float(tau[cutoff])
+
+
+class TrajectoryWriter:
+    """
+    An on-disk array of trajectory frames, which grows as frames are appended, so that
+    long runs never hold their trajectory in RAM. Frames are buffered in memory, and
+    written in chunks to the end of a .npy file, after which the length recorded in
+    the header of the file is updated in place. Numpy reserves space in the header for
+    this purpose, and so the file is always a valid array of the frames written so far,
+    which can be read with np.load(path, mmap_mode="r").
+
+    Parameters:
+        path (str): The .npy file that stores the frames.
+        frame_shape (tuple): The shape of each frame.
+        dtype (np.dtype): The data type of the stored frames.
+        chunk_size (int): The number of frames buffered in memory between writes.
+        append (bool): If True and the file already exists, new frames are added after
+            the frames already stored in it, so that a resumed run continues the same
+            trajectory. Otherwise, the file is overwritten.
+
+    Attributes:
+        n_frames (int): The number of frames written to disk.
+    """
+
+    def __init__(self, path, frame_shape, dtype=float, chunk_size=100, append=False):
+        self.path = path
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.chunk_size = chunk_size
+        self._buffer = np.empty((chunk_size,) + self.frame_shape, dtype=self.dtype)
+        self._n_buffered = 0
+
+        try:
+            self._file = open(path, "r+b" if append else "w+b")
+        except FileNotFoundError:
+            self._file = open(path, "w+b")
+        header = self._read_header()
+        if header is None:
+            self.n_frames = 0
+            self._write_header()
+            self._offset = self._file.tell()
+        else:
+            shape, fortran_order, dtype = header
+            if shape[1:] != self.frame_shape or dtype != self.dtype or fortran_order:
+                raise ValueError(f"The frames stored in {path} do not match this writer")
+            self.n_frames = shape[0]
+            self._offset = self._file.tell()
+            # Drop any partial frames written after the header was last updated
+            self._file.truncate(self._offset + self.n_frames * self._frame_bytes)
+
+    @property
+    def _frame_bytes(self):
+        return int(np.prod(self.frame_shape)) * self.dtype.itemsize
+
+    def _read_header(self):
+        """Read the shape, order and data type stored in the file, or None if empty"""
+        self._file.seek(0)
+        if not self._file.read(1):
+            return None
+        self._file.seek(0)
+        version = np.lib.format.read_magic(self._file)
+        if version == (1, 0):
+            return np.lib.format.read_array_header_1_0(self._file)
+        return np.lib.format.read_array_header_2_0(self._file)
+
+    def _write_header(self):
+        """Write the header of the file, with the current number of frames"""
+        self._file.seek(0)
+        np.lib.format.write_array_header_1_0(self._file, {
+            "descr": np.lib.format.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (self.n_frames,) + self.frame_shape
+        })
+
+    def __len__(self):
+        return self.n_frames + self._n_buffered
+
+    def append(self, frame):
+        """
+        Add a frame to the trajectory.
+
+        Args:
+            frame (np.ndarray): The frame to store, with shape frame_shape
+        """
+        self._buffer[self._n_buffered] = frame
+        self._n_buffered += 1
+        if self._n_buffered == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered frames to disk, and update the header"""
+        if self._n_buffered == 0:
+            return
+        self._file.seek(self._offset + self.n_frames * self._frame_bytes)
+        self._file.write(self._buffer[:self._n_buffered].tobytes())
+        self.n_frames += self._n_buffered
+        self._n_buffered = 0
+        self._write_header()
+        if self._file.tell() != self._offset:
+            raise RuntimeError("The header of the trajectory file changed length")
+        self._file.flush()
+
+    def close(self):
+        """Write the buffered frames, and close the file"""
+        self.flush()
+        self._file.close()
 
 
 class Bond:
@@ -15,7 +339,9 @@ class Bond:
         v (np.ndarray): Initial vector (shape (3,)); will be normalized.
 
     Attributes:
-        v (np.ndarray): Unit vector (shape (3,)).
+        v (np.ndarray): Unit vector (shape (3,)). This may be a view of a row of a 
+            larger array of tangent vectors, in which case rotations write through to
+            that array.
 
     Methods:
         rotate_in_place(axis: np.ndarray, angle: float): Rotate about an 
@@ -30,6 +356,13 @@ class Bond:
             raise ValueError("Zero vector is not allowed for Bond.")
         self.v = v / n
 
+    @classmethod
+    def _from_view(cls, v):
+        """Wrap an existing unit vector, such as a row of an array, without copying."""
+        bond = cls.__new__(cls)
+        bond.v = v
+        return bond
+
     def rotate_in_place(self, axis: np.ndarray, angle: float):
         """
         Given an arbitrary axis and angle, rotate a vector in place by Rodrigues' 
@@ -42,18 +375,14 @@ class Bond:
         Returns:
             None
         """
-        a = np.asarray(axis, dtype=float).reshape(3)
+        a = np.array(axis, dtype=float).reshape(3)
         na = np.linalg.norm(a)
         if na == 0.0:
             # Degenerate axis: no rotation
             return
         a /= na
-        c, s = np.cos(angle), np.sin(angle)
-        v = self.v
-        # Rodrigues rotation
-        v_rot = v * c + np.cross(a, v) * s + a * (np.dot(a, v)) * (1.0 - c)
-        # Guard against FP drift
-        self.v = v_rot / np.linalg.norm(v_rot)
+        # Write into the existing array, so that views of a chain stay in sync
+        rotate(self.v, a, angle, out=self.v)
 
     # Numpy interop: treat Bond like its vector
     def __array__(self, dtype=None):
@@ -66,7 +395,8 @@ class Bond:
 class WormlikeChainMC:
     """Discrete 3D wormlike chain with Metropolis updates in tangent space.
 
-    The chain is represented by N unit bond vectors (Bond objects) of fixed length b.
+    The chain is represented by N unit bond vectors of fixed length b, stored as the
+    rows of a single (N, 3) array that is updated in place. 
     Positions are reconstructed by r_{k+1} = r_k + b t_k (with r_0 at the origin).
     Bending energy: E = kappa * sum_i (1 - t_i · t_{i+1}).
 
@@ -75,42 +405,120 @@ class WormlikeChainMC:
         b (float): Bond length (segment length).
         kappa (float): Bending stiffness (k_B T units). Persistence length l_p = kappa * b.
         beta (float): Inverse temperature 1/T (k_B=1).
-        random_state (int | None): Random state for numpy.random.
+        random_state (int | np.random.Generator | None): Random seed for numpy.random.
+            If a Generator is passed, it is used for all random draws instead of the 
+            global random state.
+        method (str): The Monte Carlo sweep. "serial" proposes a rotation of one 
+            randomly-chosen bond at a time. "checkerboard" proposes rotations of all 
+            even-indexed bonds at once, and then all odd-indexed bonds at once. Because
+            only neighboring bonds interact, the bonds within each half are independent,
+            and each half-sweep satisfies detailed balance.
+        moves (dict): The number of attempts of each collective move per sweep, which
+            are made after the local rotations. "pivot" rotates every bond after a 
+            randomly-chosen bond by a single rotation. "crankshaft" rotates a 
+            randomly-chosen run of bonds about the line joining its two ends, which 
+            leaves the rest of the chain in place. Both moves only change the energy at
+            the ends of the rotated bonds, and they relax the shape of stiff chains 
+            much faster than local rotations.
 
     Attributes:
         N (int): Number of bonds.
         b (float): Bond length.
         kappa (float): Bending stiffness.
         beta (float): Inverse temperature.
-        bonds (list[Bond]): List of N Bond instances (unit vectors).
+        t (np.ndarray): The unit tangent vectors of the chain (shape (N, 3)).
+        bonds (list[Bond]): List of N Bond instances, which are views of the rows of t.
+            Rotating a Bond in place rotates the corresponding row of t.
+        E (float): The bending energy of the chain, which is updated incrementally by 
+            each accepted move in sweep.
+        step_size (float): The proposal rotation angle scale used by the last 
+            simulation, which is tuned during equilibration if a target acceptance
+            is given.
+        rng (np.random.Generator): The random number generator used by every move,
+            which is the numpy.random module unless a Generator is passed.
     """
-    def __init__(self, N=400, b=1.0, kappa=20.0, beta=1.0, random_state=None):
+    # Map from the method keyword to the name of the sweep. Subclasses can extend this
+    # dictionary to register additional sweeps.
+    _sweep_methods = {
+        "serial": "_sweep_serial",
+        "checkerboard": "_sweep_checkerboard"
+    }
+
+    # Map from the name of each collective move to the method that attempts it once.
+    # Subclasses can extend this dictionary to register additional moves.
+    _move_methods = {
+        "pivot": "_move_pivot",
+        "crankshaft": "_move_crankshaft"
+    }
+
+    def __init__(
+        self, 
+        N=400, 
+        b=1.0, 
+        kappa=20.0, 
+        beta=1.0, 
+        random_state=None, 
+        method="serial", 
+        moves=None
+    ):
         self.N, self.b = int(N), float(b)
         self.kappa, self.beta = float(kappa), float(beta)
         self.random_state = random_state
-        np.random.seed(random_state)
+        self.rng = _get_rng(random_state)
+        if method not in self._sweep_methods:
+            raise ValueError(
+                f"Unknown method {method}, expected one of {list(self._sweep_methods)}"
+            )
+        self.method = method
+        self._sweep = getattr(self, self._sweep_methods[method])
+        self.moves = dict(moves or {})
+        for name in self.moves:
+            if name not in self._move_methods:
+                raise ValueError(
+                    f"Unknown move {name}, expected one of {list(self._move_methods)}"
+                )
+        self.step_size = None
+
+        # The tangents are stored between two rows of zeros, so that the neighbors of
+        # the end bonds can be read without checking the boundaries
+        self._t_padded = np.zeros((self.N + 2, 3))
+        self.t = self._t_padded[1:-1]
 
-        ## start nearly straight with small transverse noise, then normalize per Bond
-        base = np.tile(np.array([1.0, 0.0, 0.0], dtype=float), (self.N, 1))
-        base += 0.05 * np.random.normal(size=base.shape)
-        self.bonds = [Bond(v) for v in base]
+        ## start nearly straight, by tilting each bond by a small random rotation
+        self.t[:] = np.array([1.0, 0.0, 0.0])
+        axes = random_unit_vecs(self.N, self.rng)
+        rotate(self.t, axes, 0.05 * self.rng.normal(size=self.N), out=self.t)
+
+        # Preallocated proposal buffers, so that sweeps do not allocate per proposal
+        self._axes = np.empty(((self.N + 1) // 2, 3))
+        self._trial = np.empty(((self.N + 1) // 2, 3))
+        self._bonds = None
+        self.E = self.energy()
 
         ## calculate the persistence length
         self.lp = self.kappa * self.b * self.beta
 
+    @property
+    def bonds(self):
+        """List of N Bond instances that share memory with the rows of t."""
+        # The Bond objects are only created if they are requested
+        if self._bonds is None:
+            self._bonds = [Bond._from_view(row) for row in self.t]
+        return self._bonds
+
     def tangent_vectors(self):
-        """Stack current bond vectors into a (N, 3) ndarray."""
-        return np.vstack([b.v for b in self.bonds])
+        """Return a copy of the current bond vectors as a (N, 3) ndarray."""
+        return self.t.copy()
 
     def positions(self):
         """Return positions r_k, k=0..N as shape (N+1,3) with r_0 = 0."""
         r = np.zeros((self.N + 1, 3), dtype=float)
-        np.cumsum(self.b * self.tangent_vectors(), axis=0, out=r[1:])
+        np.cumsum(self.b * self.t, axis=0, out=r[1:])
         return r
 
     def energy(self):
         """Compute the total bending energy of the chain."""
-        t = self.tangent_vectors()
+        t = self.t
         dots = (t[:-1] * t[1:]).sum(axis=1)
         return float(self.kappa * np.sum(1.0 - dots))
 
@@ -128,32 +536,47 @@ class WormlikeChainMC:
         # raise NotImplementedError("Implement this method")
     
         dE = 0.0
+        t = self.t
     
         # Compute the change in energy due to the neighbor on the left, skipping
         # the first bonds.
         if i > 0:
-            dE += self.kappa * ((1.0 - float(np.dot(trial_vec, self.bonds[i - 1].v)))
-                                - (1.0 - float(np.dot(self.bonds[i].v, self.bonds[i - 1].v))))
+            dE += self.kappa * ((1.0 - float(np.dot(trial_vec, t[i - 1])))
+                                - (1.0 - float(np.dot(t[i], t[i - 1]))))
             
         # Compute the change in energy due to the neighbor on the right, skipping
         # the last bond.
         if i < self.N - 1:
-            dE += self.kappa * ((1.0 - float(np.dot(trial_vec, self.bonds[i + 1].v)))
-                                - (1.0 - float(np.dot(self.bonds[i].v, self.bonds[i + 1].v))))
+            dE += self.kappa * ((1.0 - float(np.dot(trial_vec, t[i + 1])))
+                                - (1.0 - float(np.dot(t[i], t[i + 1]))))
             
         return float(dE)
 
     def sweep(self, step_size: float = 0.3):
         """
         One Monte Carlo sweep consists of attempting N local rotations, one for each 
-        bond on the chain.
+        bond on the chain. The proposals are made by the sweep selected with the 
+        method keyword, and are followed by any collective moves.
 
         Args:
             step_size (float): Typical rotation angle (radians) for proposals.
 
         Returns:
             dict: {'acc': float, 'E': float} The fraction of moves that were accepted
-                and the final energy of the chain after the sweep.
+                and the final energy of the chain after the sweep. The fraction of each
+                collective move that was accepted is stored under its name.
+        """
+        result = self._sweep(step_size)
+        for name, n_moves in self.moves.items():
+            move = getattr(self, self._move_methods[name])
+            num_accepted = sum(move(step_size) for _ in range(n_moves))
+            result[f"{name} accepted fraction"] = num_accepted / max(n_moves, 1)
+        result["E"] = self.E
+        return result
+
+    def _sweep_serial(self, step_size):
+        """
+        Attempt N local rotations, each of a randomly-chosen bond, one at a time.
         """
         # ################################################################################
         # #
@@ -162,8 +585,10 @@ class WormlikeChainMC:
         # #
         # # Your implementation should visit each bond once, propose a new bond, calculate
         # # the change in energy, and then accept or reject the proposed move using a 
-        # # Metropolis acceptance test. Be sure to use the copy method of the Bond object
-        # # to propose a new bond, to avoid modifying the original bond in place.
+        # # Metropolis acceptance test. Be sure to propose the rotated bond without 
+        # # modifying the chain in place, and only write it back if the move is accepted.
+        # # The change in energy only depends on the neighbors of the bond, as in 
+        # # _local_deltaE.
         # #
         # #  Your implementation should keep a counter of the number of accepted moves, so
         # #  that you can return the acceptance rate as part of the return value. This is
@@ -175,33 +600,137 @@ class WormlikeChainMC:
         # ################################################################################
         # raise NotImplementedError("Implement this method")
     
-        num_accepted = 0
-        for _ in range(self.N):
+        ## Sample the parameters of every random update in bulk
+        sites = self.rng.choice(self.N, size=self.N)  # choose random bonds
+        axes = random_unit_vecs(self.N, self.rng)  # choose random axes
+        angles = self.rng.normal(scale=step_size, size=self.N)  # choose random angles
+        thresholds = self.rng.random(self.N)
 
-            ## Sample parameters of random update
-            i = np.random.randint(self.N)  # choose a random bond
-            axis = random_unit_vec()      # choose a random axis
-            angle = np.random.normal(scale=step_size) # choose a random angle
+        # Each proposal is handled with Python floats, on a list copy of the padded 
+        # tangents, so that no arrays are allocated inside the loop. Row i + 1 of the 
+        # padded tangents is bond i, and the zero rows at either end mean that the end
+        # bonds only see one neighbor.
+        t = self._t_padded.tolist()
+        proposals = zip(
+            (sites + 1).tolist(), 
+            axes.tolist(), 
+            np.cos(angles).tolist(), 
+            np.sin(angles).tolist(), 
+            thresholds.tolist()
+        )
+        kappa, beta = self.kappa, self.beta
 
-            ## propose a rotated vector by copying the bond and rotating it
-            trial = self.bonds[i].copy()
-            trial.rotate_in_place(axis, angle)
-            t_new = trial.v  # Unit length by construction
+        num_accepted = 0
+        for i, (ax, ay, az), c, s, threshold in proposals:
+
+            ## propose a rotated vector by Rodrigues' formula, without modifying the chain
+            vx, vy, vz = t[i]
+            d = (ax * vx + ay * vy + az * vz) * (1.0 - c)
+            wx = vx * c + (ay * vz - az * vy) * s + ax * d
+            wy = vy * c + (az * vx - ax * vz) * s + ay * d
+            wz = vz * c + (ax * vy - ay * vx) * s + az * d
+            norm = math.sqrt(wx * wx + wy * wy + wz * wz) # guard against FP drift
+            wx, wy, wz = wx / norm, wy / norm, wz / norm
 
             ## Compute the change in energy from the proposed move
-            dE = self._local_deltaE(i, t_new)
+            (lx, ly, lz), (rx, ry, rz) = t[i - 1], t[i + 1]
+            dE = kappa * (
+                (vx - wx) * (lx + rx) + (vy - wy) * (ly + ry) + (vz - wz) * (lz + rz)
+            )
 
             ## Use the Metropolis acceptance test to determine whether to accept the move
-            if dE <= 0.0 or np.random.random() < np.exp(-self.beta * dE):
-                # accept: rotate in place (keeps unit length by construction)
-                self.bonds[i].rotate_in_place(axis, angle)
+            if dE <= 0.0 or threshold < math.exp(-beta * dE):
+                # accept: overwrite the row in place, and update the energy
+                t[i] = [wx, wy, wz]
+                self._t_padded[i] = t[i]
+                self.E += dE
                 num_accepted += 1
-                
-        return {"accepted fraction": num_accepted / self.N, "E": self.energy()}
+
+        return {"accepted fraction": num_accepted / self.N, "E": self.E}
+
+    def _sweep_checkerboard(self, step_size):
+        """
+        Attempt a rotation of every bond, updating all of the even-indexed bonds at once
+        and then all of the odd-indexed bonds at once. The rotation axes, angles and 
+        acceptance tests of each half are drawn in bulk.
+        """
+        num_accepted = 0
+        for start in (0, 1):
+            # Strided views of every other bond, and of the bonds on either side
+            t_old = self.t[start::2]
+            k = len(t_old)
+            left, right = self._t_padded[start::2][:k], self._t_padded[start + 2::2][:k]
+            axes = random_unit_vecs(k, self.rng, out=self._axes[:k])
+            angles = self.rng.normal(scale=step_size, size=k)
+            t_new = rotate(t_old, axes, angles, out=self._trial[:k])
+
+            ## The padding rows are zero, so the end bonds only see one neighbor
+            dE = self.kappa * np.sum((t_old - t_new) * (left + right), axis=1)
+
+            ## Metropolis acceptance test for every proposal at once
+            accept = (dE <= 0.0) | (self.rng.random(k) < np.exp(-self.beta * dE))
+            t_old[accept] = t_new[accept]
+            self.E += float(np.sum(dE[accept]))
+            num_accepted += int(np.sum(accept))
+
+        return {"accepted fraction": num_accepted / self.N, "E": self.E}
+
+    def _metropolis(self, dE):
+        """Metropolis acceptance test for a single move with energy change dE."""
+        return dE <= 0.0 or self.rng.random() < np.exp(-self.beta * dE)
+
+    def _move_pivot(self, step_size):
+        """
+        Attempt a pivot move, which rotates every bond from a randomly-chosen bond i to
+        the end of the chain by the same rotation. Only the angle between bonds i - 1 
+        and i changes, and so the tail is only rotated if the move is accepted.
+        """
+        if self.N < 2:
+            return False
+        i = 1 + self.rng.choice(self.N - 1)
+        axis = random_unit_vecs(1, self.rng)[0]
+        angle = self.rng.normal(scale=step_size)
+        t_new = rotate(self.t[i], axis, angle, out=self._trial[0])
+        dE = self.kappa * float(np.dot(self.t[i - 1], self.t[i] - t_new))
+        if not self._metropolis(dE):
+            return False
+        rotate(self.t[i:], axis, angle, out=self.t[i:])
+        self.E += dE
+        return True
+
+    def _move_crankshaft(self, step_size):
+        """
+        Attempt a crankshaft move, which rotates the bonds i, ..., j - 1 about the line
+        joining their two ends. The sum of the rotated bonds is unchanged, and so the 
+        rest of the chain stays in place, and only the angles at the two ends of the 
+        run change.
+        """
+        if self.N < 2:
+            return False
+        i = self.rng.choice(self.N - 1)
+        j = i + 2 + self.rng.choice(self.N - 1 - i)
+        axis = self.t[i:j].sum(axis=0)
+        norm = np.linalg.norm(axis)
+        angle = self.rng.normal(scale=step_size)
+        if norm == 0.0:
+            return False
+        segment = rotate(self.t[i:j], axis / norm, angle)
+
+        ## The padding rows are zero, so runs at the ends of the chain see one neighbor
+        left, right = self._t_padded[i], self._t_padded[j + 1]
+        dE = self.kappa * (
+            float(np.dot(left, self.t[i] - segment[0])) 
+            + float(np.dot(right, self.t[j - 1] - segment[-1]))
+        )
+        if not self._metropolis(dE):
+            return False
+        self.t[i:j] = segment
+        self.E += dE
+        return True
 
     def end_to_end(self):
         """Return end-to-end vector R and its squared length."""
-        R = self.b * self.tangent_vectors().sum(axis=0)
+        R = self.b * self.t.sum(axis=0)
         return R, float(np.dot(R, R))
 
     def tangent_correlation(self):
@@ -212,25 +741,409 @@ class WormlikeChainMC:
         """
         max_sep = (self.N - 1) // 4 # Largest separation is 1/4 of chain length
         s_vals = np.arange(0, max_sep + 1, dtype=int)
-        t = self.tangent_vectors()
-        C = np.zeros_like(s_vals, dtype=float)
-        for si, s in enumerate(s_vals):
-            dots = (t[: self.N - s] * t[s:]).sum(axis=1)
-            C[si] = float(np.mean(dots))
+        C = _autocorrelation(self.t)[: max_sep + 1]
         return s_vals, C
-    
 
-    def simulate(self, n_eq, step_size=0.25):
+    def save_checkpoint(self, path):
+        """
+        Save the state of the chain and of its random number generator to a compressed
+        .npz file, so that a run can be resumed exactly with load_checkpoint.
+
+        Args:
+            path (str): The checkpoint file. numpy adds the .npz extension if missing.
+        """
+        np.savez_compressed(
+            path,
+            t=self.t,
+            E=self.E,
+            b=self.b,
+            kappa=self.kappa,
+            beta=self.beta,
+            step_size=np.nan if self.step_size is None else self.step_size,
+            rng_state=_get_rng_state(self.rng)
+        )
+
+    def load_checkpoint(self, path):
+        """
+        Restore the state of the chain and of its random number generator from a file 
+        written by save_checkpoint. The chain must have the same number of bonds, and 
+        the same kind of random number generator, as the chain that was saved.
+
+        Args:
+            path (str): The checkpoint file.
+
+        Returns:
+            self (WormlikeChainMC): The restored chain
+        """
+        with np.load(path) as checkpoint:
+            if checkpoint["t"].shape != self.t.shape:
+                raise ValueError("The checkpoint has a different number of bonds")
+            # Write into the existing buffer, so that the padding and bonds stay valid
+            self.t[:] = checkpoint["t"]
+            self.E = float(checkpoint["E"])
+            self.b = float(checkpoint["b"])
+            self.kappa, self.beta = float(checkpoint["kappa"]), float(checkpoint["beta"])
+            step_size = float(checkpoint["step_size"])
+            self.step_size = None if np.isnan(step_size) else step_size
+            _set_rng_state(self.rng, checkpoint["rng_state"])
+        self.lp = self.kappa * self.b * self.beta
+        return self
+
+    def simulate(
+        self, 
+        n_eq, 
+        step_size=0.25, 
+        n_sweeps=0, 
+        batch_size=100, 
+        target_acceptance=None, 
+        trajectory=None, 
+        save_every=1
+    ):
         """
-        Simulate the wormlike chain and return self
+        Simulate the wormlike chain. The chain is first equilibrated, and then, if any
+        production sweeps are requested, the observables are accumulated after every 
+        production sweep in fixed memory, with error bars from batch means.
+
+        If a target acceptance is given, the step size is tuned after every 
+        equilibration sweep, growing when too many moves are accepted and shrinking 
+        when too few are accepted. The step size is then held fixed during the 
+        production sweeps, so that they satisfy detailed balance.
 
         Args:
             n_eq (int): Number of of sweeps to equilibrate the chain.
             step_size (float): Proposal rotation angle scale (radians).
+            n_sweeps (int): Number of production sweeps after equilibration. Defaults
+                to 0, in which case the chain is only equilibrated and no observables 
+                are measured.
+            batch_size (int): Number of consecutive sweeps averaged into each batch 
+                mean, which should be longer than the autocorrelation time.
+            target_acceptance (float): The fraction of local moves that should be 
+                accepted. If None, the step size is not tuned.
+            trajectory (TrajectoryWriter | str): If not None, the positions of the chain
+                are streamed to disk every save_every production sweeps. A path creates
+                a new TrajectoryWriter, which is closed at the end of the run, while an
+                open writer is flushed and left open, so that a resumed run can keep 
+                appending to it. Equilibration sweeps are never saved, so a trajectory
+                requires n_sweeps > 0.
+            save_every (int): The number of production sweeps between saved frames.
 
         Returns:
-            dict: {'E': np.ndarray, 'R2': np.ndarray, 'acc': np.ndarray, 't_corr': (s, C), 'chain': WormlikeChainMC}
+            WormlikeChainMC | dict: If n_sweeps is 0, the chain itself is returned, as 
+                in earlier versions. Otherwise, a dictionary is returned instead, which
+                breaks callers that expect the chain:
+                {'E': np.ndarray, 'R2': np.ndarray, 'acc': np.ndarray, 't_corr': (s, C), 'chain': WormlikeChainMC}
+                The mean and standard error of the energy, squared end-to-end distance
+                and acceptance fraction, as arrays [mean, error], and the mean tangent
+                correlation. The full RunningStatistics of each observable are stored 
+                in self.observables. The integrated autocorrelation times of the 
+                observables, in sweeps, are stored under 'tau', and the final step 
+                size under 'step_size'.
         """
+        if trajectory is not None and not n_sweeps:
+            raise ValueError(
+                "Only production sweeps are saved to the trajectory, so n_sweeps must "
+                "be positive when a trajectory is given."
+            )
         for _ in range(n_eq):
-            self.sweep(step_size=step_size)
+            result = self.sweep(step_size=step_size)
+            if target_acceptance is not None:
+                acc = result["accepted fraction"]
+                step_size = float(np.clip(
+                    step_size * np.exp(acc - target_acceptance), 1e-3, np.pi
+                ))
+        self.step_size = step_size
+        if not n_sweeps:
+            return self
+
+        max_sep = (self.N - 1) // 4
+        self.observables = {
+            "E": RunningStatistics(batch_size=batch_size),
+            "R2": RunningStatistics(batch_size=batch_size),
+            "acc": RunningStatistics(batch_size=batch_size),
+            "t_corr": RunningStatistics(shape=(max_sep + 1,), batch_size=batch_size)
+        }
+        writer = trajectory
+        if isinstance(trajectory, str):
+            writer = TrajectoryWriter(trajectory, (self.N + 1, 3))
+        for step in range(n_sweeps):
+            result = self.sweep(step_size=step_size)
+            self.observables["E"].add(self.E)
+            self.observables["R2"].add(self.end_to_end()[1])
+            self.observables["acc"].add(result["accepted fraction"])
+            self.observables["t_corr"].add(_autocorrelation(self.t)[: max_sep + 1])
+            if writer is not None and (step + 1) % save_every == 0:
+                writer.append(self.positions())
+        if isinstance(trajectory, str):
+            writer.close()
+        elif writer is not None:
+            writer.flush()
+
+        results = {
+            key: np.array([stats.mean, stats.error]) 
+            for key, stats in self.observables.items() if key != "t_corr"
+        }
+        results["t_corr"] = (np.arange(max_sep + 1), self.observables["t_corr"].mean)
+        results["tau"] = {
+            key: self.observables[key].autocorrelation_time for key in ("E", "R2")
+        }
+        results["step_size"] = step_size
+        results["chain"] = self
+        return results
+
+
+class WormlikeChainEnsemble:
+    """An ensemble of independent discrete 3D wormlike chains, with replica exchange.
+
+    The R replicas are stored as a single (R, N, 3) array of unit tangent vectors, and
+    every replica is advanced at once by checkerboard Metropolis sweeps, as in 
+    WormlikeChainMC with method="checkerboard". Each replica has its own bending 
+    stiffness and inverse temperature, so a single ensemble can scan a range of 
+    (kappa, beta) values. Optionally, neighboring replicas can swap configurations
+    (replica exchange, or parallel tempering), which helps stiff or cold replicas
+    escape slowly-relaxing configurations.
+
+    Parameters:
+        n_replicas (int): Number of replicas. If None, the number of replicas is set 
+            by the length of kappa or beta.
+        N (int): Number of bonds in each chain.
+        b (float): Bond length (segment length).
+        kappa (float | np.ndarray): Bending stiffness of each replica (k_B T units).
+        beta (float | np.ndarray): Inverse temperature of each replica. For replica 
+            exchange, neighboring replicas should have neighboring temperatures.
+        random_state (int | np.random.Generator | None): Random seed for numpy.random,
+            as in WormlikeChainMC. If a Generator is passed, it is used for all random 
+            draws instead of the global random state.
+
+    Attributes:
+        R (int): Number of replicas.
+        N (int): Number of bonds in each chain.
+        kappa (np.ndarray): Bending stiffness of each replica (shape (R,)).
+        beta (np.ndarray): Inverse temperature of each replica (shape (R,)).
+        t (np.ndarray): The unit tangent vectors of every replica (shape (R, N, 3)).
+        bending (np.ndarray): The sum of (1 - t_i · t_{i+1}) over each chain, which is 
+            updated incrementally by every accepted move (shape (R,)).
+        swap_attempts (np.ndarray): The number of attempted exchanges between each 
+            pair of neighboring replicas (shape (R - 1,)).
+        swap_accepted (np.ndarray): The number of accepted exchanges between each pair
+            of neighboring replicas (shape (R - 1,)).
+    """
+    def __init__(
+        self, n_replicas=None, N=400, b=1.0, kappa=20.0, beta=1.0, random_state=None
+    ):
+        if n_replicas is None:
+            n_replicas = max(np.size(kappa), np.size(beta))
+        self.R, self.N, self.b = int(n_replicas), int(N), float(b)
+        self.kappa = np.broadcast_to(np.asarray(kappa, dtype=float), (self.R,)).copy()
+        self.beta = np.broadcast_to(np.asarray(beta, dtype=float), (self.R,)).copy()
+        self.random_state = random_state
+        self.rng = _get_rng(random_state)
+
+        # As in WormlikeChainMC, each chain is stored between two rows of zeros
+        self._t_padded = np.zeros((self.R, self.N + 2, 3))
+        self.t = self._t_padded[:, 1:-1]
+
+        ## start nearly straight, by tilting each bond by a small random rotation
+        self.t[:] = np.array([1.0, 0.0, 0.0])
+        axes = random_unit_vecs((self.R, self.N), self.rng)
+        angles = 0.05 * self.rng.normal(size=(self.R, self.N))
+        rotate(self.t, axes, angles, out=self.t)
+
+        # Preallocated proposal buffers, so that sweeps do not allocate per proposal
+        self._axes = np.empty((self.R, (self.N + 1) // 2, 3))
+        self._trial = np.empty((self.R, (self.N + 1) // 2, 3))
+        self.bending = self._bending()
+
+        self.swap_attempts = np.zeros(max(self.R - 1, 0), dtype=int)
+        self.swap_accepted = np.zeros(max(self.R - 1, 0), dtype=int)
+        self._swap_parity = 0
+
+        ## calculate the persistence length of each replica
+        self.lp = self.kappa * self.b * self.beta
+
+    def _bending(self):
+        """Compute the sum of (1 - t_i · t_{i+1}) over each chain (shape (R,))."""
+        dots = np.sum(self.t[:, :-1] * self.t[:, 1:], axis=-1)
+        return np.sum(1.0 - dots, axis=-1)
+
+    @property
+    def E(self):
+        """The bending energy of each replica (shape (R,))."""
+        return self.kappa * self.bending
+
+    def energy(self):
+        """Compute the total bending energy of each replica from scratch (shape (R,))."""
+        return self.kappa * self._bending()
+
+    def positions(self):
+        """Return positions of each replica as shape (R, N+1, 3) with r_0 = 0."""
+        r = np.zeros((self.R, self.N + 1, 3), dtype=float)
+        np.cumsum(self.b * self.t, axis=1, out=r[:, 1:])
+        return r
+
+    def end_to_end(self):
+        """Return end-to-end vectors (shape (R, 3)) and their squared lengths (R,)."""
+        R = self.b * self.t.sum(axis=1)
+        return R, np.sum(R * R, axis=-1)
+
+    def sweep(self, step_size=0.3):
+        """
+        Attempt a rotation of every bond of every replica, updating all of the 
+        even-indexed bonds at once and then all of the odd-indexed bonds at once.
+
+        Args:
+            step_size (float | np.ndarray): Typical rotation angle (radians) for 
+                proposals, either shared or one per replica.
+
+        Returns:
+            dict: {'accepted fraction': np.ndarray, 'E': np.ndarray} The fraction of 
+                moves that were accepted and the energy of each replica after the sweep.
+        """
+        step_size = np.broadcast_to(np.asarray(step_size, dtype=float), (self.R,))
+        num_accepted = np.zeros(self.R, dtype=int)
+        for start in (0, 1):
+            t_old = self.t[:, start::2]
+            k = t_old.shape[1]
+            left = self._t_padded[:, start::2][:, :k]
+            right = self._t_padded[:, start + 2::2][:, :k]
+            axes = random_unit_vecs((self.R, k), self.rng, out=self._axes[:, :k])
+            angles = step_size[:, None] * self.rng.normal(size=(self.R, k))
+            t_new = rotate(t_old, axes, angles, out=self._trial[:, :k])
+
+            d_bending = np.sum((t_old - t_new) * (left + right), axis=-1)
+            dE = self.kappa[:, None] * d_bending
+
+            ## Metropolis acceptance test for every proposal of every replica at once
+            boltzmann = np.exp(-self.beta[:, None] * dE)
+            accept = (dE <= 0.0) | (self.rng.random((self.R, k)) < boltzmann)
+            t_old[accept] = t_new[accept]
+            self.bending += np.sum(np.where(accept, d_bending, 0.0), axis=1)
+            num_accepted += np.sum(accept, axis=1)
+
+        return {"accepted fraction": num_accepted / self.N, "E": self.E}
+
+    def exchange(self):
+        """
+        Attempt to swap the configurations of neighboring replicas. Alternate calls 
+        attempt the pairs (0, 1), (2, 3), ... and (1, 2), (3, 4), ..., so that the 
+        pairs in each call are independent. A swap between replicas i and j is 
+        accepted with probability min(1, exp(-Δ)), where 
+        Δ = β_i E_i(x_j) + β_j E_j(x_i) - β_i E_i(x_i) - β_j E_j(x_j).
+
+        Returns:
+            np.ndarray: Boolean array marking the accepted swaps, indexed by the lower
+                replica of each pair that was attempted.
+        """
+        i = np.arange(self._swap_parity, self.R - 1, 2)
+        j = i + 1
+        self._swap_parity = 1 - self._swap_parity
+
+        # The energy of each replica is its stiffness times the bending of the chain
+        beta_kappa = self.beta * self.kappa
+        delta = (beta_kappa[i] - beta_kappa[j]) * (self.bending[j] - self.bending[i])
+        accept = self.rng.random(len(i)) < np.exp(-delta)
+        self.swap_attempts[i] += 1
+        self.swap_accepted[i[accept]] += 1
+
+        i, j = i[accept], j[accept]
+        self.t[i], self.t[j] = self.t[j].copy(), self.t[i].copy()
+        self.bending[i], self.bending[j] = self.bending[j], self.bending[i]
+        return accept
+
+    def save_checkpoint(self, path):
+        """
+        Save the state of every replica and of the random number generator to a 
+        compressed .npz file, so that a run can be resumed exactly with load_checkpoint.
+
+        Args:
+            path (str): The checkpoint file. numpy adds the .npz extension if missing.
+        """
+        np.savez_compressed(
+            path,
+            t=self.t,
+            bending=self.bending,
+            b=self.b,
+            kappa=self.kappa,
+            beta=self.beta,
+            swap_attempts=self.swap_attempts,
+            swap_accepted=self.swap_accepted,
+            swap_parity=self._swap_parity,
+            rng_state=_get_rng_state(self.rng)
+        )
+
+    def load_checkpoint(self, path):
+        """
+        Restore the state of every replica and of the random number generator from a 
+        file written by save_checkpoint. The ensemble must have the same number of 
+        replicas and bonds, and the same kind of bit generator, as the saved ensemble.
+
+        Args:
+            path (str): The checkpoint file.
+
+        Returns:
+            self (WormlikeChainEnsemble): The restored ensemble
+        """
+        with np.load(path) as checkpoint:
+            if checkpoint["t"].shape != self.t.shape:
+                raise ValueError(
+                    "The checkpoint has a different number of replicas or bonds"
+                )
+            self.t[:] = checkpoint["t"]
+            self.bending = checkpoint["bending"].copy()
+            self.b = float(checkpoint["b"])
+            self.kappa, self.beta = checkpoint["kappa"].copy(), checkpoint["beta"].copy()
+            self.swap_attempts = checkpoint["swap_attempts"].copy()
+            self.swap_accepted = checkpoint["swap_accepted"].copy()
+            self._swap_parity = int(checkpoint["swap_parity"])
+            _set_rng_state(self.rng, checkpoint["rng_state"])
+        self.lp = self.kappa * self.b * self.beta
         return self
+
+    def simulate(
+        self, 
+        n_sweeps, 
+        step_size=0.25, 
+        exchange_every=None, 
+        trajectory=None, 
+        save_every=1
+    ):
+        """
+        Simulate every replica, and record observables after each sweep.
+
+        Args:
+            n_sweeps (int): Number of sweeps.
+            step_size (float | np.ndarray): Proposal rotation angle scale (radians).
+            exchange_every (int): Number of sweeps between replica exchange attempts. 
+                If None, the replicas are never exchanged.
+            trajectory (TrajectoryWriter | str): If not None, the positions of every 
+                replica are streamed to disk every save_every sweeps, as in 
+                WormlikeChainMC.simulate.
+            save_every (int): The number of sweeps between saved frames.
+
+        Returns:
+            dict: {'E': np.ndarray, 'R2': np.ndarray, 'acc': np.ndarray, 
+                'swap': np.ndarray, 'ensemble': WormlikeChainEnsemble} The energy, 
+                squared end-to-end distance and acceptance fraction of each replica 
+                after each sweep (shape (n_sweeps, R)), and the fraction of accepted 
+                exchanges between each pair of neighboring replicas.
+        """
+        E = np.zeros((n_sweeps, self.R))
+        R2 = np.zeros((n_sweeps, self.R))
+        acc = np.zeros((n_sweeps, self.R))
+        writer = trajectory
+        if isinstance(trajectory, str):
+            writer = TrajectoryWriter(trajectory, (self.R, self.N + 1, 3))
+        for step in range(n_sweeps):
+            result = self.sweep(step_size=step_size)
+            if exchange_every is not None and (step + 1) % exchange_every == 0:
+                self.exchange()
+            E[step], acc[step] = self.E, result["accepted fraction"]
+            R2[step] = self.end_to_end()[1]
+            if writer is not None and (step + 1) % save_every == 0:
+                writer.append(self.positions())
+        if isinstance(trajectory, str):
+            writer.close()
+        elif writer is not None:
+            writer.flush()
+        swap = self.swap_accepted / np.maximum(self.swap_attempts, 1)
+        return {"E": E, "R2": R2, "acc": acc, "swap": swap, "ensemble": self}
+